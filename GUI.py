@@ -10,15 +10,22 @@ Funcionalidades:
 import tkinter as tk
 from tkinter import ttk, messagebox
 import socket
+import selectors
+import errno
 import threading
+import queue
+import concurrent.futures
 import time
 import datetime
 import json
+import logging
 import requests
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass
 from typing import Dict, List, Optional
 import os
 
+log = logging.getLogger("parqueo.gui")
+
 # Configuración
 # PARA RASPBERRY PI REALES: Cambiar por las IPs reales de tus Raspberry Pi
 RASPBERRY_IP_1 = "10.99.207.214"  # IP real de la Raspberry Pi 1 (Parqueo 1)
@@ -29,16 +36,74 @@ RASPBERRY_PORT_1 = 1718  # Puerto para Parqueo 1
 RASPBERRY_PORT_2 = 1719  # Puerto para Parqueo 2
 ESPACIOS_TOTALES = 2  # Total de espacios por parqueo 
 TARIFA_POR_10_SEGUNDOS = 1000  # Colones
+PKEY = ("parqueo1", "parqueo2")  # Clave de cada parqueo: PKEY[parqueo - 1]
+INTERVALO_MIN_VERIFICACION = 2.0  # Segundos durante los que se reutiliza la última verificación
+
+# Mensajes de error por parqueo desconectado (armados una sola vez)
+MSG_BARRERA_DESCONECTADA = {p: f"Parqueo {p} no está conectado. No se puede ejecutar el comando." for p in (1, 2)}
+MSG_LED_DESCONECTADO = {p: f"Parqueo {p} no está conectado. No se puede controlar el LED." for p in (1, 2)}
+
+# Keepalive de las conexiones persistentes (detectar una Raspberry Pi caída en ~25 s, no en horas)
+KEEPALIVE_INACTIVO = 10  # Segundos sin tráfico antes del primer sondeo
+KEEPALIVE_INTERVALO = 5  # Segundos entre sondeos
+KEEPALIVE_SONDEOS = 3  # Sondeos sin respuesta antes de dar la conexión por perdida
+
+# Comandos del protocolo con las Raspberry Pi, ya codificados (cada mensaje termina en \n)
+CMD_ESTADO = b"ESTADO\n"
+CMD_ABRIR = b"ABRIR_PASO\n"
+CMD_SUBIR = b"SUBIR\n"
+CMD_BAJAR = b"BAJAR\n"
+_COMANDOS = {"ESTADO": CMD_ESTADO, "ABRIR_PASO": CMD_ABRIR, "SUBIR": CMD_SUBIR, "BAJAR": CMD_BAJAR}
+
+# Persistencia
+ARCHIVO_DATOS = "parqueo_datos.json"  # Snapshot completo del estado
+ARCHIVO_EVENTOS = "parqueo_eventos.jsonl"  # Journal: un evento JSON por línea
+INTERVALO_SNAPSHOT_MS = 30000  # Guardar snapshot cada 30 segundos
 
-@dataclass
+# Tipo de cambio
+URL_TIPO_CAMBIO = "https://api.exchangerate-api.com/v4/latest/USD"
+ARCHIVO_TIPO_CAMBIO = "tc_cache.json"  # Último tipo de cambio obtenido de la API
+TIPO_CAMBIO_TTL = 6 * 3600  # Segundos que se reutiliza el valor guardado
+
+@dataclass(slots=True)
 class Vehiculo:
     """Clase para representar un vehículo en el parqueo"""
     id: str
-    hora_entrada: datetime.datetime
-    hora_salida: Optional[datetime.datetime] = None
+    hora_entrada: float  # Timestamp Unix (time.time())
+    hora_salida: Optional[float] = None
     parqueo: int = 1  # 1 o 2
     costo: int = 0
     pagado: bool = False
+    
+    def to_json_obj(self):
+        """Dict serializable del vehículo (más rápido que dataclasses.asdict)"""
+        return {"id": self.id, "hora_entrada": self.hora_entrada, "hora_salida": self.hora_salida,
+                "parqueo": self.parqueo, "costo": self.costo, "pagado": self.pagado}
+
+# Codificador compacto reutilizado para snapshot y journal (una sola cadena por escritura)
+_json_encoder = json.JSONEncoder(separators=(",", ":"))
+
+def _a_timestamp(valor):
+    """Convertir una hora guardada a timestamp (acepta el formato ISO anterior)"""
+    if isinstance(valor, str):
+        return datetime.datetime.fromisoformat(valor).timestamp()
+    return valor
+
+def _leds_a_mascara(leds):
+    """Convertir el estado de LEDs guardado a máscara de bits (acepta el formato anterior de lista)"""
+    if isinstance(leds, list):
+        return sum(1 << i for i, ocupado in enumerate(leds) if ocupado)
+    return leds
+
+def _dict_a_vehiculo(datos):
+    """Reconstruir un Vehiculo desde su dict serializado (sin copiar ni modificar el dict)"""
+    hora_salida = datos["hora_salida"]
+    return Vehiculo(id=datos["id"],
+                    hora_entrada=_a_timestamp(datos["hora_entrada"]),
+                    hora_salida=_a_timestamp(hora_salida) if hora_salida else None,
+                    parqueo=datos["parqueo"],
+                    costo=datos["costo"],
+                    pagado=datos.get("pagado", False))
 
 class ParqueoManager:
     """Manejador principal del sistema de parqueos"""
@@ -46,23 +111,49 @@ class ParqueoManager:
     def __init__(self):
         self.vehiculos_activos = {}  # ID -> Vehiculo
         self.historial_vehiculos = []  # Lista de todos los vehículos
+        self._historial_serializado = []  # Dicts ya serializados del historial (no cambian)
+        # Acumulados del historial por parqueo, actualizados en cada salida
+        self._total_vehiculos = {"parqueo1": 0, "parqueo2": 0}
+        self._total_colones = {"parqueo1": 0, "parqueo2": 0}
         self.espacios_ocupados = {"parqueo1": 0, "parqueo2": 0}
-        self.leds_estado = {"parqueo1": [False] * ESPACIOS_TOTALES, "parqueo2": [False] * ESPACIOS_TOTALES}
+        self.leds_estado = {"parqueo1": 0, "parqueo2": 0}  # Máscara de bits: bit i = espacio i ocupado
         self.tipo_cambio_usd = 500  # Valor por defecto
         self.conexiones_raspberry = {"parqueo1": False, "parqueo2": False}
         self.ips_raspberry = {"parqueo1": RASPBERRY_IP_1, "parqueo2": RASPBERRY_IP_2}
         self.puertos_raspberry = {"parqueo1": RASPBERRY_PORT_1, "parqueo2": RASPBERRY_PORT_2}
+        # Conexión TCP persistente por parqueo, reutilizada entre comandos
+        self._sockets = {"parqueo1": None, "parqueo2": None}
+        self._sock_locks = {"parqueo1": threading.Lock(), "parqueo2": threading.Lock()}
+        # Buffer de recepción por parqueo (protegido por el mismo lock que el socket)
+        self._recv_bufs = {"parqueo1": bytearray(1024), "parqueo2": bytearray(1024)}
+        # Última verificación de conexiones (time.monotonic) y su resultado
+        self._ultima_verificacion = 0.0
+        self._resultado_verificacion = {}
+        # Hilos para la E/S con las Raspberry Pi (fuera del hilo de Tk)
+        self.io_executor = concurrent.futures.ThreadPoolExecutor(max_workers=2)
+        self._http = requests.Session()
+        self._sucio = False  # Hay eventos en el journal que aún no están en el snapshot
+        self._secuencia = 0  # Número del último evento registrado (el snapshot guarda hasta cuál incluye)
         self.cargar_datos()
-        self.actualizar_tipo_cambio()
+        self._journal = open(ARCHIVO_EVENTOS, "a", buffering=1)
     
     def actualizar_tipo_cambio(self):
-        """Obtener tipo de cambio actual del dólar"""
+        """Obtener tipo de cambio actual del dólar (reutiliza el guardado si es reciente)"""
+        try:
+            if os.path.getmtime(ARCHIVO_TIPO_CAMBIO) > time.time() - TIPO_CAMBIO_TTL:
+                with open(ARCHIVO_TIPO_CAMBIO, "r") as f:
+                    self.tipo_cambio_usd = json.load(f)["tc"]
+                print(f"Tipo de cambio guardado: ₡{self.tipo_cambio_usd} por $1")
+                return
+        except (OSError, ValueError, KeyError):
+            pass  # No hay valor guardado válido, consultar la API
+        
         try:
             # API gratuita para tipo de cambio
-            response = requests.get("https://api.exchangerate-api.com/v4/latest/USD", timeout=5)
-            data = response.json()
-            # Aproximación para colones costarricenses (usar valor fijo si no está disponible)
-            self.tipo_cambio_usd = 509  # Valor aproximado actual
+            response = self._http.get(URL_TIPO_CAMBIO, timeout=5)
+            self.tipo_cambio_usd = response.json()["rates"]["CRC"]
+            with open(ARCHIVO_TIPO_CAMBIO, "w") as f:
+                json.dump({"tc": self.tipo_cambio_usd, "t": time.time()}, f)
             print(f"Tipo de cambio actualizado: ₡{self.tipo_cambio_usd} por $1")
         except:
             print("No se pudo actualizar el tipo de cambio, usando valor por defecto")
@@ -74,13 +165,13 @@ class ParqueoManager:
         
         vehiculo = Vehiculo(
             id=vehiculo_id,
-            hora_entrada=datetime.datetime.now(),
+            hora_entrada=time.time(),
             parqueo=parqueo
         )
         
         self.vehiculos_activos[vehiculo_id] = vehiculo
-        self.espacios_ocupados[f"parqueo{parqueo}"] += 1
-        self.guardar_datos()
+        self.espacios_ocupados[PKEY[parqueo - 1]] += 1
+        self._registrar_evento("entrada", v=vehiculo.to_json_obj())
         return True, f"Vehículo {vehiculo_id} registrado en parqueo {parqueo}"
     
     def registrar_salida(self, vehiculo_id: str):
@@ -89,56 +180,58 @@ class ParqueoManager:
             return False, "El vehículo no está registrado en el parqueo", 0
         
         vehiculo = self.vehiculos_activos[vehiculo_id]
-        vehiculo.hora_salida = datetime.datetime.now()
+        vehiculo.hora_salida = time.time()
         
         # Calcular tiempo de estancia en segundos
-        tiempo_estancia = (vehiculo.hora_salida - vehiculo.hora_entrada).total_seconds()
+        tiempo_estancia = vehiculo.hora_salida - vehiculo.hora_entrada
         
         # Calcular costo (1000 colones por cada 10 segundos)
-        bloques_10_segundos = max(1, int(tiempo_estancia // 10) + (1 if tiempo_estancia % 10 > 0 else 0))
+        bloques_10_segundos = max(1, int(-(-tiempo_estancia // 10)))  # Techo de tiempo/10
         vehiculo.costo = bloques_10_segundos * TARIFA_POR_10_SEGUNDOS
         
-        # Mover al historial
-        self.historial_vehiculos.append(vehiculo)
+        # Mover al historial (se serializa una sola vez, ya no cambia)
+        vehiculo_dict = vehiculo.to_json_obj()
+        self._agregar_historial(vehiculo, vehiculo_dict)
         del self.vehiculos_activos[vehiculo_id]
-        self.espacios_ocupados[f"parqueo{vehiculo.parqueo}"] -= 1
-        self.guardar_datos()
+        self.espacios_ocupados[PKEY[vehiculo.parqueo - 1]] -= 1
+        self._registrar_evento("salida", v=vehiculo_dict)
         
         return True, f"Vehículo {vehiculo_id} salió. Tiempo: {tiempo_estancia:.0f}s", vehiculo.costo
     
     def toggle_led(self, parqueo: int, espacio: int):
         """Cambiar estado de un LED específico"""
-        parqueo_key = f"parqueo{parqueo}"
+        parqueo_key = PKEY[parqueo - 1]
         if 0 <= espacio < ESPACIOS_TOTALES:
-            self.leds_estado[parqueo_key][espacio] = not self.leds_estado[parqueo_key][espacio]
+            self.leds_estado[parqueo_key] ^= 1 << espacio
+            ocupado = self.led_ocupado(parqueo, espacio)
             
-            # Actualizar contador de espacios ocupados
-            self.espacios_ocupados[parqueo_key] = sum(self.leds_estado[parqueo_key])
+            # Actualizar contador de espacios ocupados (LEDs marcados como ocupados)
+            self.espacios_ocupados[parqueo_key] = self.leds_estado[parqueo_key].bit_count()
+            self._registrar_evento("led", parqueo=parqueo, espacio=espacio, estado=ocupado)
             return True
         return False
     
+    def led_ocupado(self, parqueo: int, espacio: int):
+        """Indicar si el LED de un espacio está marcado como ocupado"""
+        return bool(self.leds_estado[PKEY[parqueo - 1]] >> espacio & 1)
+    
+    def _agregar_historial(self, vehiculo, vehiculo_dict):
+        """Agregar un vehículo al historial y actualizar los acumulados"""
+        parqueo_key = PKEY[vehiculo.parqueo - 1]
+        self.historial_vehiculos.append(vehiculo)
+        self._historial_serializado.append(vehiculo_dict)
+        self._total_vehiculos[parqueo_key] += 1
+        self._total_colones[parqueo_key] += vehiculo.costo
+    
     def obtener_estadisticas(self):
         """Obtener estadísticas históricas"""
-        if not self.historial_vehiculos:
-            return {
-                "total_vehiculos": {"parqueo1": 0, "parqueo2": 0, "total": 0},
-                "ganancias_colones": {"parqueo1": 0, "parqueo2": 0, "total": 0},
-                "ganancias_dolares": {"parqueo1": 0, "parqueo2": 0, "total": 0}
-            }
-        
         stats = {
-            "total_vehiculos": {"parqueo1": 0, "parqueo2": 0, "total": 0},
-            "ganancias_colones": {"parqueo1": 0, "parqueo2": 0, "total": 0},
-            "ganancias_dolares": {"parqueo1": 0.0, "parqueo2": 0.0, "total": 0.0}
+            "total_vehiculos": dict(self._total_vehiculos),
+            "ganancias_colones": dict(self._total_colones),
+            "ganancias_dolares": {}
         }
-        
-        for vehiculo in self.historial_vehiculos:
-            parqueo_key = f"parqueo{vehiculo.parqueo}"
-            stats["total_vehiculos"][parqueo_key] += 1
-            stats["total_vehiculos"]["total"] += 1
-            
-            stats["ganancias_colones"][parqueo_key] += vehiculo.costo
-            stats["ganancias_colones"]["total"] += vehiculo.costo
+        stats["total_vehiculos"]["total"] = sum(self._total_vehiculos.values())
+        stats["ganancias_colones"]["total"] = sum(self._total_colones.values())
         
         # Convertir a dólares
         for key in ["parqueo1", "parqueo2", "total"]:
@@ -146,41 +239,236 @@ class ParqueoManager:
         
         return stats
     
-    def verificar_conexion_raspberry(self, parqueo: int):
+    def configurar_ip(self, parqueo: int, ip: str):
+        """Cambiar la IP de un parqueo (descarta la conexión anterior)"""
+        parqueo_key = PKEY[parqueo - 1]
+        if self.ips_raspberry[parqueo_key] != ip:
+            with self._sock_locks[parqueo_key]:
+                self.ips_raspberry[parqueo_key] = ip
+                self._cerrar_socket(parqueo_key)
+            self._ultima_verificacion = 0.0  # El resultado guardado era de la IP anterior
+    
+    def _obtener_socket(self, parqueo_key, timeout):
+        """Obtener la conexión persistente al parqueo, creándola si no existe"""
+        s = self._sockets[parqueo_key]
+        if s is None:
+            s = self._crear_socket()
+            s.settimeout(timeout)
+            try:
+                s.connect((self.ips_raspberry[parqueo_key], self.puertos_raspberry[parqueo_key]))
+            except OSError:
+                s.close()
+                raise
+            self._sockets[parqueo_key] = s
+        else:
+            s.settimeout(timeout)
+        return s
+    
+    def _crear_socket(self):
+        """Crear un socket TCP con las opciones usadas para hablar con los parqueos"""
+        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        s.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        # Las opciones finas de keepalive dependen del sistema operativo
+        for opcion, valor in (("TCP_KEEPIDLE", KEEPALIVE_INACTIVO),
+                              ("TCP_KEEPINTVL", KEEPALIVE_INTERVALO),
+                              ("TCP_KEEPCNT", KEEPALIVE_SONDEOS)):
+            if hasattr(socket, opcion):
+                s.setsockopt(socket.IPPROTO_TCP, getattr(socket, opcion), valor)
+        return s
+    
+    def _conectar_sin_bloquear(self, parqueo_key):
+        """Iniciar la conexión al parqueo sin esperar a que se complete"""
+        s = self._crear_socket()
+        s.setblocking(False)
+        err = s.connect_ex((self.ips_raspberry[parqueo_key], self.puertos_raspberry[parqueo_key]))
+        if err not in (0, errno.EINPROGRESS, errno.EWOULDBLOCK):
+            s.close()
+            raise OSError(err, os.strerror(err))
+        self._sockets[parqueo_key] = s
+        return s
+    
+    def _cerrar_socket(self, parqueo_key):
+        """Cerrar y descartar la conexión persistente de un parqueo"""
+        s = self._sockets[parqueo_key]
+        self._sockets[parqueo_key] = None
+        if s is not None:
+            try:
+                s.close()
+            except OSError:
+                pass
+    
+    def enviar_comando(self, parqueo: int, comando: str, timeout: float = 5):
+        """Enviar un comando al parqueo por la conexión persistente y devolver la respuesta"""
+        parqueo_key = PKEY[parqueo - 1]
+        datos = _COMANDOS.get(comando) or (comando + "\n").encode('utf-8')
+        buf = self._recv_bufs[parqueo_key]
+        with self._sock_locks[parqueo_key]:
+            for intento in range(2):
+                reutilizada = self._sockets[parqueo_key] is not None
+                try:
+                    s = self._obtener_socket(parqueo_key, timeout)
+                    s.sendall(datos)
+                    n = self._recibir_linea(s, buf, parqueo_key)
+                    self.conexiones_raspberry[parqueo_key] = True
+                    return buf[:n].decode('utf-8')
+                except socket.timeout:
+                    self._cerrar_socket(parqueo_key)
+                    self.conexiones_raspberry[parqueo_key] = False
+                    raise
+                except OSError:
+                    self._cerrar_socket(parqueo_key)
+                    # Una conexión reutilizada pudo ser cerrada por el parqueo: reconectar una vez
+                    if reutilizada and intento == 0:
+                        continue
+                    self.conexiones_raspberry[parqueo_key] = False
+                    raise
+    
+    def _recibir_linea(self, s, buf, parqueo_key):
+        """Leer en buf una respuesta terminada en \n y devolver su largo (sin el \n).
+        Si el parqueo cierra después de enviar algo, o la línea llena el buffer, se acepta lo
+        recibido y se descarta la conexión: el resto de la línea no debe tomarse como la
+        respuesta al próximo comando. Un timeout a media línea se propaga."""
+        vista = memoryview(buf)
+        n = 0
+        while n < len(buf):
+            leidos = s.recv_into(vista[n:])
+            if not leidos:
+                if n:
+                    break
+                raise ConnectionResetError("Conexión cerrada por el parqueo")
+            fin = buf.find(b"\n", n, n + leidos)
+            if fin >= 0:
+                return fin
+            n += leidos
+        self._cerrar_socket(parqueo_key)
+        return n
+    
+    def verificar_conexion_raspberry(self, parqueo: int, timeout: float = 3):
         """Verificar conexión con una Raspberry Pi específica"""
-        parqueo_key = f"parqueo{parqueo}"
+        try:
+            response = self.enviar_comando(parqueo, "ESTADO", timeout)
+        except Exception as e:
+            return self._evaluar_estado(parqueo, None, e)
+        return self._evaluar_estado(parqueo, response)
+    
+    def _evaluar_estado(self, parqueo, response, error=None):
+        """Clasificar la respuesta (o el error) a ESTADO y actualizar el estado de conexión"""
+        parqueo_key = PKEY[parqueo - 1]
         ip = self.ips_raspberry[parqueo_key]
         puerto = self.puertos_raspberry[parqueo_key]
         
-        try:
-            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-                s.settimeout(3)
-                s.connect((ip, puerto))
-                s.send("ESTADO".encode('utf-8'))
-                response = s.recv(1024).decode('utf-8')
-                # Verificar que la respuesta sea válida
-                if "ESTADO_OK" in response or "OK" in response:
-                    self.conexiones_raspberry[parqueo_key] = True
-                    return True, f"Parqueo {parqueo} conectado en {ip}:{puerto} - Respuesta: {response}"
-                else:
-                    self.conexiones_raspberry[parqueo_key] = False
-                    return False, f"Respuesta inválida de Parqueo {parqueo}: {response}"
-        except ConnectionRefusedError:
-            self.conexiones_raspberry[parqueo_key] = False
+        # Verificar que la respuesta sea válida
+        exito = error is None and ("ESTADO_OK" in response or "OK" in response)
+        self.conexiones_raspberry[parqueo_key] = exito
+        if exito:
+            return True, f"Parqueo {parqueo} conectado en {ip}:{puerto} - Respuesta: {response}"
+        if error is None:
+            return False, f"Respuesta inválida de Parqueo {parqueo}: {response}"
+        if isinstance(error, ConnectionRefusedError):
             return False, f"Conexión rechazada a Parqueo {parqueo} en {ip}:{puerto} - ¿Servidor iniciado?"
-        except socket.timeout:
-            self.conexiones_raspberry[parqueo_key] = False
+        if isinstance(error, socket.timeout):
             return False, f"Timeout conectando a Parqueo {parqueo} en {ip}:{puerto}"
-        except Exception as e:
-            self.conexiones_raspberry[parqueo_key] = False
-            return False, f"Error conectando Parqueo {parqueo}: {str(e)}"
+        return False, f"Error conectando Parqueo {parqueo}: {str(error)}"
     
-    def verificar_todas_conexiones(self):
-        """Verificar conexión con todas las Raspberry Pi"""
+    def _consultar_estado_simultaneo(self, timeout):
+        """Enviar ESTADO a todos los parqueos a la vez y esperar las respuestas con un selector.
+        Devuelve {parqueo_key: (respuesta, error)}; se llama con los locks de todos los sockets tomados."""
+        respuestas = {}
+        sel = selectors.DefaultSelector()
+        for parqueo_key in PKEY:
+            # data = [parqueo_key, conexión reutilizada, bytes recibidos]
+            s = self._sockets[parqueo_key]
+            if s is not None:
+                # Conexión ya establecida: enviar de una vez y esperar solo la respuesta
+                try:
+                    s.setblocking(False)
+                    s.send(CMD_ESTADO)
+                    sel.register(s, selectors.EVENT_READ, [parqueo_key, True, 0])
+                    continue
+                except OSError:
+                    self._cerrar_socket(parqueo_key)  # Cerrada por el parqueo: reconectar
+            try:
+                s = self._conectar_sin_bloquear(parqueo_key)
+            except OSError as e:
+                respuestas[parqueo_key] = (None, e)
+                continue
+            sel.register(s, selectors.EVENT_WRITE, [parqueo_key, False, 0])
+        
+        limite = time.monotonic() + timeout
+        while sel.get_map():
+            restante = limite - time.monotonic()
+            if restante <= 0:
+                break
+            for clave, eventos in sel.select(restante):
+                s = clave.fileobj
+                parqueo_key, reutilizada, n = clave.data
+                try:
+                    if eventos & selectors.EVENT_WRITE:
+                        # Conectado (o falló la conexión): enviar el comando
+                        err = s.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+                        if err:
+                            raise OSError(err, os.strerror(err))
+                        s.send(CMD_ESTADO)
+                        sel.modify(s, selectors.EVENT_READ, clave.data)
+                    else:
+                        # Acumular hasta el fin de línea (la respuesta puede llegar en partes)
+                        buf = self._recv_bufs[parqueo_key]
+                        leidos = s.recv_into(memoryview(buf)[n:])
+                        if not leidos:
+                            if not n:
+                                raise ConnectionResetError("Conexión cerrada por el parqueo")
+                            fin = n  # Cerró después de responder: aceptar lo recibido
+                            self._cerrar_socket(parqueo_key)
+                        else:
+                            fin = buf.find(b"\n", n, n + leidos)
+                            clave.data[2] = n = n + leidos
+                            if fin < 0:
+                                if n < len(buf):
+                                    continue  # Falta el resto de la línea
+                                fin = n  # Buffer lleno sin \n: aceptar lo recibido y descartar la conexión
+                                self._cerrar_socket(parqueo_key)
+                        respuestas[parqueo_key] = (buf[:fin].decode('utf-8'), None)
+                        sel.unregister(s)
+                except OSError as e:
+                    sel.unregister(s)
+                    self._cerrar_socket(parqueo_key)
+                    respuestas[parqueo_key] = (None, e)
+                    # Una conexión reutilizada pudo ser cerrada por el parqueo: reconectar una vez
+                    if reutilizada:
+                        try:
+                            s = self._conectar_sin_bloquear(parqueo_key)
+                            sel.register(s, selectors.EVENT_WRITE, [parqueo_key, False, 0])
+                        except OSError as e_reconexion:
+                            respuestas[parqueo_key] = (None, e_reconexion)
+        
+        # Los que no terminaron de responder a tiempo; una línea a medias también se descarta
+        # junto con la conexión, para que su resto no llegue como respuesta al próximo comando
+        for clave in list(sel.get_map().values()):
+            parqueo_key = clave.data[0]
+            sel.unregister(clave.fileobj)
+            self._cerrar_socket(parqueo_key)
+            respuestas[parqueo_key] = (None, socket.timeout("timed out"))
+        sel.close()
+        return respuestas
+    
+    def verificar_todas_conexiones(self, timeout: float = 3):
+        """Verificar conexión con todas las Raspberry Pi en paralelo (reutiliza el resultado si es muy reciente)"""
+        if time.monotonic() - self._ultima_verificacion < INTERVALO_MIN_VERIFICACION:
+            return self._resultado_verificacion
+        for parqueo_key in PKEY:
+            self._sock_locks[parqueo_key].acquire()
+        try:
+            respuestas = self._consultar_estado_simultaneo(timeout)
+        finally:
+            for parqueo_key in PKEY:
+                self._sock_locks[parqueo_key].release()
         resultados = {}
-        for parqueo in [1, 2]:
-            exito, mensaje = self.verificar_conexion_raspberry(parqueo)
-            resultados[f"parqueo{parqueo}"] = {"conectado": exito, "mensaje": mensaje}
+        for parqueo, parqueo_key in enumerate(PKEY, 1):
+            exito, mensaje = self._evaluar_estado(parqueo, *respuestas[parqueo_key])
+            resultados[parqueo_key] = {"conectado": exito, "mensaje": mensaje}
+        self._resultado_verificacion = resultados
+        self._ultima_verificacion = time.monotonic()
         return resultados
     
     def todas_raspberry_conectadas(self):
@@ -189,70 +477,126 @@ class ParqueoManager:
     
     def controlar_barrera(self, accion: str, parqueo: int = 1):
         """Enviar comando a la barrera (Raspberry Pi específica)"""
-        parqueo_key = f"parqueo{parqueo}"
-        ip = self.ips_raspberry[parqueo_key]
-        puerto = self.puertos_raspberry[parqueo_key]
-        
         try:
-            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-                s.settimeout(5)
-                s.connect((ip, puerto))
-                s.send(accion.encode('utf-8'))
-                response = s.recv(1024).decode('utf-8')
-                return True, response
+            response = self.enviar_comando(parqueo, accion, timeout=5)
+            return True, response
         except Exception as e:
             return False, f"Error de conexión con Parqueo {parqueo}: {str(e)}"
     
+    def _registrar_evento(self, tipo, **campos):
+        """Agregar un evento al journal (una línea JSON por evento)"""
+        self._secuencia += 1
+        campos["tipo"] = tipo
+        campos["ts"] = time.time()
+        campos["n"] = self._secuencia
+        self._journal.write(_json_encoder.encode(campos) + "\n")
+        self._sucio = True
+    
+    def _aplicar_evento(self, evento):
+        """Aplicar un evento del journal sobre el estado cargado del snapshot"""
+        tipo = evento["tipo"]
+        if tipo == "entrada":
+            vehiculo = _dict_a_vehiculo(evento["v"])
+            # Si ya está activo, el evento quedó incluido en el snapshot
+            if vehiculo.id not in self.vehiculos_activos:
+                self.vehiculos_activos[vehiculo.id] = vehiculo
+                self.espacios_ocupados[PKEY[vehiculo.parqueo - 1]] += 1
+        elif tipo == "salida":
+            vehiculo = _dict_a_vehiculo(evento["v"])
+            if self.vehiculos_activos.pop(vehiculo.id, None) is not None:
+                self._agregar_historial(vehiculo, evento["v"])
+                self.espacios_ocupados[PKEY[vehiculo.parqueo - 1]] -= 1
+        elif tipo == "led":
+            parqueo_key = PKEY[evento['parqueo'] - 1]
+            bit = 1 << evento["espacio"]
+            if evento["estado"]:
+                self.leds_estado[parqueo_key] |= bit
+            else:
+                self.leds_estado[parqueo_key] &= ~bit
+            self.espacios_ocupados[parqueo_key] = self.leds_estado[parqueo_key].bit_count()
+    
+    def _reproducir_journal(self):
+        """Reproducir los eventos registrados después del último snapshot"""
+        incluidos = self._secuencia  # Eventos que el snapshot ya contiene
+        try:
+            with open(ARCHIVO_EVENTOS, "r") as f:
+                for linea in f:
+                    if not linea.strip():
+                        continue
+                    try:
+                        evento = json.loads(linea)
+                    except json.JSONDecodeError:
+                        break  # Última línea incompleta (cierre abrupto)
+                    # Corte entre la escritura del snapshot y el vaciado del journal
+                    if evento["n"] <= incluidos:
+                        continue
+                    self._aplicar_evento(evento)
+                    self._secuencia = evento["n"]
+                    self._sucio = True
+        except FileNotFoundError:
+            pass
+    
     def guardar_datos(self):
-        """Guardar datos en archivo JSON"""
+        """Guardar snapshot completo en archivo JSON y vaciar el journal"""
         datos = {
-            "vehiculos_activos": {k: asdict(v) for k, v in self.vehiculos_activos.items()},
-            "historial_vehiculos": [asdict(v) for v in self.historial_vehiculos],
+            "vehiculos_activos": {k: v.to_json_obj() for k, v in self.vehiculos_activos.items()},
+            "historial_vehiculos": self._historial_serializado,
             "espacios_ocupados": self.espacios_ocupados,
-            "leds_estado": self.leds_estado
+            "leds_estado": self.leds_estado,
+            "secuencia": self._secuencia
         }
         
-        # Convertir datetime a string para JSON
-        for vehiculo in datos["vehiculos_activos"].values():
-            vehiculo["hora_entrada"] = vehiculo["hora_entrada"].isoformat() if isinstance(vehiculo["hora_entrada"], datetime.datetime) else vehiculo["hora_entrada"]
-            if vehiculo["hora_salida"]:
-                vehiculo["hora_salida"] = vehiculo["hora_salida"].isoformat()
-        
-        for vehiculo in datos["historial_vehiculos"]:
-            vehiculo["hora_entrada"] = vehiculo["hora_entrada"].isoformat() if isinstance(vehiculo["hora_entrada"], datetime.datetime) else vehiculo["hora_entrada"]
-            if vehiculo["hora_salida"]:
-                vehiculo["hora_salida"] = vehiculo["hora_salida"].isoformat()
-        
-        with open("parqueo_datos.json", "w") as f:
-            json.dump(datos, f, indent=2)
+        # Escribir a un temporal y reemplazar: un corte a medio guardar no deja el archivo vacío
+        temporal = ARCHIVO_DATOS + ".tmp"
+        with open(temporal, "w") as f:
+            f.write(_json_encoder.encode(datos))
+            f.flush()
+            os.fsync(f.fileno())  # El snapshot debe estar en disco antes de vaciar el journal
+        os.replace(temporal, ARCHIVO_DATOS)
+        
+        # El snapshot ya incluye todos los eventos del journal
+        self._journal.seek(0)
+        self._journal.truncate()
+        self._sucio = False
+    
+    def guardar_snapshot(self):
+        """Guardar snapshot solo si hubo eventos desde el último"""
+        if self._sucio:
+            self.guardar_datos()
+    
+    def cerrar(self):
+        """Guardar cambios pendientes y liberar recursos"""
+        self.guardar_snapshot()
+        self._journal.close()
+        self.io_executor.shutdown(wait=False)
+        self._http.close()
+        for parqueo_key in self._sockets:
+            self._cerrar_socket(parqueo_key)
     
     def cargar_datos(self):
-        """Cargar datos desde archivo JSON"""
+        """Cargar snapshot desde archivo JSON y reproducir el journal"""
         try:
-            with open("parqueo_datos.json", "r") as f:
+            with open(ARCHIVO_DATOS, "r") as f:
                 datos = json.load(f)
             
             # Cargar vehículos activos
-            for k, v in datos.get("vehiculos_activos", {}).items():
-                v["hora_entrada"] = datetime.datetime.fromisoformat(v["hora_entrada"])
-                if v["hora_salida"]:
-                    v["hora_salida"] = datetime.datetime.fromisoformat(v["hora_salida"])
-                self.vehiculos_activos[k] = Vehiculo(**v)
+            self.vehiculos_activos = {k: _dict_a_vehiculo(v) for k, v in datos.get("vehiculos_activos", {}).items()}
             
-            # Cargar historial
+            # Cargar historial (una sola pasada: vehículo, dict ya serializado y acumulados)
             for v in datos.get("historial_vehiculos", []):
-                v["hora_entrada"] = datetime.datetime.fromisoformat(v["hora_entrada"])
-                if v["hora_salida"]:
-                    v["hora_salida"] = datetime.datetime.fromisoformat(v["hora_salida"])
-                self.historial_vehiculos.append(Vehiculo(**v))
+                self._agregar_historial(_dict_a_vehiculo(v), v)
             
             self.espacios_ocupados = datos.get("espacios_ocupados", {"parqueo1": 0, "parqueo2": 0})
-            self.leds_estado = datos.get("leds_estado", {"parqueo1": [False] * ESPACIOS_TOTALES, "parqueo2": [False] * ESPACIOS_TOTALES})
+            leds = datos.get("leds_estado", {})
+            self.leds_estado = {k: _leds_a_mascara(leds.get(k, 0)) for k in ("parqueo1", "parqueo2")}
+            self._secuencia = datos.get("secuencia", 0)
             
         except FileNotFoundError:
             print("No se encontró archivo de datos, iniciando con datos vacíos")
         except Exception as e:
             print(f"Error cargando datos: {e}")
+        
+        self._reproducir_journal()
 
 class ParqueoGUI:
     """Interfaz gráfica para el sistema de parqueos"""
@@ -263,6 +607,26 @@ class ParqueoGUI:
         self.root.title("Sistema de Administración de Parqueos")
         self.root.geometry("1200x800")
         
+        # Resultados de tareas en segundo plano pendientes de aplicar en el hilo de Tk; la cola
+        # solo se revisa mientras haya tareas en curso
+        self._resultados_io = queue.Queue()
+        self._tareas_pendientes = 0
+        self._revision_programada = False
+        # Consultar el tipo de cambio sin retrasar el arranque
+        self._en_segundo_plano(self.manager.actualizar_tipo_cambio, self._al_actualizar_tipo_cambio)
+        
+        # Último valor aplicado por (widget, opción), para no reconfigurar si no cambió
+        self._config_widgets = {}
+        self._mascaras_mostradas = {}  # Máscara de LEDs pintada por parqueo
+        
+        # Verificación periódica de conexiones en segundo plano
+        self._verificacion_en_curso = False
+        self._indicadores_programados = False
+        
+        # Mensajes de log pendientes de insertar en el próximo ciclo ocioso de Tk
+        self._log_buf = []
+        self._log_programado = False
+        
         # Mostrar ventana de conexión primero
         if not self.mostrar_ventana_conexion():
             return  # Si no se conecta, salir
@@ -270,8 +634,14 @@ class ParqueoGUI:
         self.crear_interfaz()
         self.actualizar_display()
         
+        # Pausar la actualización periódica mientras la ventana está minimizada
+        self._pausado = False
+        self.root.bind("<Unmap>", self._al_minimizar)
+        self.root.bind("<Map>", self._al_restaurar)
+        
         # Actualizar cada segundo
         self.root.after(1000, self.actualizar_periodico)
+        self.root.after(INTERVALO_SNAPSHOT_MS, self.guardar_snapshot_periodico)
     
     def mostrar_ventana_conexion(self):
         """Mostrar ventana de configuración y conexión de Raspberry Pi"""
@@ -349,15 +719,17 @@ class ParqueoGUI:
         
         # Variable para controlar el resultado
         self.conexion_exitosa = False
+        self._prueba_en_curso = False
         
         # Probar conexiones automáticamente al abrir
         ventana_conexion.after(500, lambda: self.probar_conexiones(ventana_conexion))
         # Verificar cada 3 segundos mientras la ventana esté abierta
         def verificacion_periodica():
-            if ventana_conexion.winfo_exists():
+            self._verificacion_after_id = None
+            if ventana_conexion.winfo_exists():  # Cerrada con el botón de la ventana
                 self.probar_conexiones(ventana_conexion)
-                ventana_conexion.after(3000, verificacion_periodica)
-        ventana_conexion.after(3000, verificacion_periodica)
+                self._verificacion_after_id = ventana_conexion.after(3000, verificacion_periodica)
+        self._verificacion_after_id = ventana_conexion.after(3000, verificacion_periodica)
         
         # Esperar hasta que se cierre la ventana
         self.root.wait_window(ventana_conexion)
@@ -368,20 +740,81 @@ class ParqueoGUI:
         """Agregar mensaje al log de la ventana de conexión"""
         if hasattr(self, 'text_logs'):
             timestamp = datetime.datetime.now().strftime("%H:%M:%S")
-            self.text_logs.insert(tk.END, f"[{timestamp}] {mensaje}\n")
+            self._log_buf.append(f"[{timestamp}] {mensaje}\n")
+            if not self._log_programado:
+                self._log_programado = True
+                self.root.after_idle(self._volcar_logs)
+    
+    def _volcar_logs(self):
+        """Insertar de una vez los mensajes de log acumulados"""
+        texto = "".join(self._log_buf)
+        self._log_buf.clear()
+        self._log_programado = False
+        if self.text_logs.winfo_exists():
+            self.text_logs.insert(tk.END, texto)
             self.text_logs.see(tk.END)
     
+    def _en_segundo_plano(self, funcion, callback, *args):
+        """Ejecutar funcion en un hilo de E/S y luego callback(resultado) en el hilo de Tk"""
+        futuro = self.manager.io_executor.submit(funcion, *args)
+        futuro.add_done_callback(lambda f: self._resultados_io.put((callback, f)))
+        self._tareas_pendientes += 1
+        self._programar_revision_io()
+    
+    def _al_actualizar_tipo_cambio(self, _):
+        """Recalcular los montos en dólares con el tipo de cambio recién obtenido"""
+        if hasattr(self, "frame_stats_content"):
+            self.actualizar_estadisticas()
+    
+    def _programar_revision_io(self):
+        """Programar una revisión de la cola de resultados (una sola a la vez)"""
+        if not self._revision_programada:
+            self._revision_programada = True
+            self.root.after(50, self._procesar_resultados_io)
+    
+    def _procesar_resultados_io(self):
+        """Aplicar en el hilo de Tk los resultados de las tareas en segundo plano"""
+        self._revision_programada = False
+        try:
+            while True:
+                try:
+                    callback, futuro = self._resultados_io.get_nowait()
+                except queue.Empty:
+                    break
+                self._tareas_pendientes -= 1
+                callback(futuro.result())
+        finally:
+            # Sin tareas en curso no hay nada que esperar: no volver a despertar
+            if self._tareas_pendientes:
+                self._programar_revision_io()
+    
     def probar_conexiones(self, ventana):
         """Probar conexiones a ambas Raspberry Pi"""
+        if self._prueba_en_curso:
+            return  # La prueba anterior sigue en curso
+        self._prueba_en_curso = True
         self.log_mensaje("Iniciando pruebas de conexión...")
         
-        # Actualizar IPs desde los campos de entrada
-        self.manager.ips_raspberry["parqueo1"] = self.entry_ip1.get().strip()
-        self.manager.ips_raspberry["parqueo2"] = self.entry_ip2.get().strip()
+        # Leer IPs desde los campos de entrada
+        ip1 = self.entry_ip1.get().strip()
+        ip2 = self.entry_ip2.get().strip()
+        self.log_mensaje(f"Probando conexión con Parqueo 1 ({ip1}:{RASPBERRY_PORT_1})...")
+        self.log_mensaje(f"Probando conexión con Parqueo 2 ({ip2}:{RASPBERRY_PORT_2})...")
         
-        # Probar conexión Parqueo 1
-        self.log_mensaje(f"Probando conexión con Parqueo 1 ({self.manager.ips_raspberry['parqueo1']}:{RASPBERRY_PORT_1})...")
-        exito1, mensaje1 = self.manager.verificar_conexion_raspberry(1)
+        def probar():
+            self.manager.configurar_ip(1, ip1)
+            self.manager.configurar_ip(2, ip2)
+            return self.manager.verificar_todas_conexiones()
+        
+        self._en_segundo_plano(probar, self._mostrar_resultado_conexiones)
+    
+    def _mostrar_resultado_conexiones(self, resultados):
+        """Mostrar el resultado de probar_conexiones en la ventana de conexión"""
+        self._prueba_en_curso = False
+        if not self.label_estado1.winfo_exists():
+            return  # La ventana de conexión ya se cerró
+        exito1, mensaje1 = resultados["parqueo1"]["conectado"], resultados["parqueo1"]["mensaje"]
+        exito2, mensaje2 = resultados["parqueo2"]["conectado"], resultados["parqueo2"]["mensaje"]
         
         if exito1:
             self.label_estado1.config(text="Parqueo 1: Conectado", fg="green")
@@ -390,10 +823,6 @@ class ParqueoGUI:
             self.label_estado1.config(text="Parqueo 1: Error", fg="red")
             self.log_mensaje(f"ERROR: {mensaje1}")
         
-        # Probar conexión Parqueo 2
-        self.log_mensaje(f"Probando conexión con Parqueo 2 ({self.manager.ips_raspberry['parqueo2']}:{RASPBERRY_PORT_2})...")
-        exito2, mensaje2 = self.manager.verificar_conexion_raspberry(2)
-        
         if exito2:
             self.label_estado2.config(text="Parqueo 2: Conectado", fg="green")
             self.log_mensaje(f"EXITO: {mensaje2}")
@@ -427,6 +856,7 @@ class ParqueoGUI:
                     f"Solo {parqueo_activo} está conectado.\nAlgunas funciones estarán deshabilitadas.")
             
             self.conexion_exitosa = True
+            self._cancelar_verificacion_periodica(ventana)
             ventana.destroy()
         else:
             messagebox.showerror("Error", "Se requiere al menos una Raspberry Pi conectada")
@@ -434,9 +864,16 @@ class ParqueoGUI:
     def cancelar_conexion(self, ventana):
         """Cancelar y cerrar la aplicación"""
         self.conexion_exitosa = False
+        self._cancelar_verificacion_periodica(ventana)
         ventana.destroy()
         self.root.quit()
     
+    def _cancelar_verificacion_periodica(self, ventana):
+        """Detener la verificación periódica de la ventana de conexión"""
+        if self._verificacion_after_id is not None:
+            ventana.after_cancel(self._verificacion_after_id)
+            self._verificacion_after_id = None
+    
     def crear_interfaz(self):
         """Crear la interfaz gráfica"""
         # Notebook para pestañas
@@ -527,6 +964,11 @@ class ParqueoGUI:
                  bg="red", fg="white", font=("Arial", 10, "bold"), width=12)
         self.btn_bajar_p2.pack(side=tk.LEFT, padx=3)
         
+        # Indicador y botones de barrera de cada parqueo (se actualizan según la conexión)
+        self._labels_conexion = {"parqueo1": self.label_conexion1, "parqueo2": self.label_conexion2}
+        self._btns = {"parqueo1": (self.btn_abrir_p1, self.btn_subir_p1, self.btn_bajar_p1),
+                      "parqueo2": (self.btn_abrir_p2, self.btn_subir_p2, self.btn_bajar_p2)}
+        
         # Control de vehículos
         frame_vehiculos = ttk.LabelFrame(self.frame_principal, text="Registro de Vehículos")
         frame_vehiculos.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
@@ -564,6 +1006,7 @@ class ParqueoGUI:
         self.tree_vehiculos.column("Parqueo", width=80)
         self.tree_vehiculos.column("Entrada", width=150)
         self.tree_vehiculos.column("Tiempo", width=150)
+        self._filas_tree = {}  # ID vehículo -> [iid de su fila en el Treeview, tiempo mostrado]
     
     def crear_panel_leds(self):
         """Crear panel de control de LEDs"""
@@ -596,6 +1039,8 @@ class ParqueoGUI:
                            command=lambda x=i: self.toggle_led(2, x))
             btn.grid(row=i//5, column=i%5, padx=5, pady=5)
             self.botones_leds2.append(btn)
+        
+        self.botones_leds = {"parqueo1": self.botones_leds1, "parqueo2": self.botones_leds2}
     
     def crear_panel_estadisticas(self):
         """Crear panel de estadísticas"""
@@ -604,9 +1049,13 @@ class ParqueoGUI:
         # Frame para estadísticas
         self.frame_stats_content = tk.Frame(self.frame_stats)
         self.frame_stats_content.pack(fill=tk.BOTH, expand=True, padx=20, pady=10)
+        self._celdas_stats = []  # Labels de datos [fila][columna], creados una sola vez
         
         tk.Button(self.frame_stats, text="ACTUALIZAR ESTADÍSTICAS", command=self.actualizar_estadisticas,
                  bg="blue", fg="white", font=("Arial", 12, "bold")).pack(pady=10)
+        
+        # Construir la tabla durante el arranque y no en el primer clic
+        self.actualizar_estadisticas()
     
     def actualizar_display(self):
         """Actualizar información en pantalla"""
@@ -614,81 +1063,77 @@ class ParqueoGUI:
         espacios_disp1 = ESPACIOS_TOTALES - self.manager.espacios_ocupados["parqueo1"]
         espacios_disp2 = ESPACIOS_TOTALES - self.manager.espacios_ocupados["parqueo2"]
         
-        self.label_espacios1.config(text=f"{espacios_disp1}/{ESPACIOS_TOTALES}")
-        self.label_espacios2.config(text=f"{espacios_disp2}/{ESPACIOS_TOTALES}")
-        
         # Cambiar color según disponibilidad
         color1 = "green" if espacios_disp1 > 1 else "orange" if espacios_disp1 > 0 else "red"
         color2 = "green" if espacios_disp2 > 1 else "orange" if espacios_disp2 > 0 else "red"
         
-        self.label_espacios1.config(fg=color1)
-        self.label_espacios2.config(fg=color2)
-        
-        # Actualizar indicadores de conexión
-        conexion1 = self.manager.conexiones_raspberry.get("parqueo1", False)
-        conexion2 = self.manager.conexiones_raspberry.get("parqueo2", False)
-        
-        self.label_conexion1.config(fg="green" if conexion1 else "red")
-        self.label_conexion2.config(fg="green" if conexion2 else "red")
-        
-        # Actualizar tooltips/textos de ayuda
-        tooltip1 = "Conectado" if conexion1 else "Desconectado"
-        tooltip2 = "Conectado" if conexion2 else "Desconectado"
-        
-        # Actualizar estado de botones de control según conexión
-        if hasattr(self, 'btn_abrir_p1'):
-            estado1 = tk.NORMAL if conexion1 else tk.DISABLED
-            estado2 = tk.NORMAL if conexion2 else tk.DISABLED
-            
-            # Botones Parqueo 1
-            self.btn_abrir_p1.config(state=estado1)
-            self.btn_subir_p1.config(state=estado1)
-            self.btn_bajar_p1.config(state=estado1)
-            
-            # Botones Parqueo 2
-            self.btn_abrir_p2.config(state=estado2)
-            self.btn_subir_p2.config(state=estado2)
-            self.btn_bajar_p2.config(state=estado2)
-        
-        # Actualizar combo de parqueos para mostrar solo los disponibles
-        if hasattr(self, 'combo_parqueo'):
-            parqueos_disponibles = []
-            if conexion1:
-                parqueos_disponibles.append("1")
-            if conexion2:
-                parqueos_disponibles.append("2")
-            
-            if parqueos_disponibles:
-                self.combo_parqueo.config(values=parqueos_disponibles)
-                if self.combo_parqueo.get() not in parqueos_disponibles:
-                    self.combo_parqueo.set(parqueos_disponibles[0])
-            else:
-                self.combo_parqueo.config(values=["Sin conexión"])
-        
-        # Actualizar lista de vehículos activos
-        for item in self.tree_vehiculos.get_children():
-            self.tree_vehiculos.delete(item)
-        
-        for vehiculo_id, vehiculo in self.manager.vehiculos_activos.items():
-            tiempo_transcurrido = datetime.datetime.now() - vehiculo.hora_entrada
-            self.tree_vehiculos.insert("", "end", values=(
-                vehiculo_id,
-                vehiculo.parqueo,
-                vehiculo.hora_entrada.strftime("%H:%M:%S"),
-                str(tiempo_transcurrido).split(".")[0]
-            ))
-        
-        # Actualizar botones de LEDs
-        for i, btn in enumerate(self.botones_leds1):
-            color = "red" if self.manager.leds_estado["parqueo1"][i] else "lightgray"
-            btn.config(bg=color)
-        
-        for i, btn in enumerate(self.botones_leds2):
-            color = "red" if self.manager.leds_estado["parqueo2"][i] else "lightgray"
-            btn.config(bg=color)
+        self._cfg(self.label_espacios1, text=f"{espacios_disp1}/{ESPACIOS_TOTALES}", fg=color1)
+        self._cfg(self.label_espacios2, text=f"{espacios_disp2}/{ESPACIOS_TOTALES}", fg=color2)
+        
+        # Actualizar indicadores, botones y combo según la conexión
+        self._aplicar_estado_conexion()
+        
+        # Actualizar lista de vehículos activos (sin reconstruir el Treeview)
+        activos = self.manager.vehiculos_activos
+        for vehiculo_id in self._filas_tree.keys() - activos.keys():
+            self.tree_vehiculos.delete(self._filas_tree.pop(vehiculo_id)[0])
+        
+        ahora = time.time()
+        for vehiculo_id, vehiculo in activos.items():
+            horas, resto = divmod(int(ahora - vehiculo.hora_entrada), 3600)
+            minutos, segundos = divmod(resto, 60)
+            tiempo = f"{horas:02d}:{minutos:02d}:{segundos:02d}"
+            fila = self._filas_tree.get(vehiculo_id)
+            if fila is None:
+                iid = self.tree_vehiculos.insert("", "end", values=(
+                    vehiculo_id,
+                    vehiculo.parqueo,
+                    datetime.datetime.fromtimestamp(vehiculo.hora_entrada).strftime("%H:%M:%S"),
+                    tiempo
+                ))
+                self._filas_tree[vehiculo_id] = [iid, tiempo]
+            elif fila[1] != tiempo:
+                self.tree_vehiculos.set(fila[0], "Tiempo", tiempo)
+                fila[1] = tiempo
+        
+        # Actualizar botones de LEDs (solo si la máscara cambió desde el último pintado)
+        for parqueo_key, botones in self.botones_leds.items():
+            mascara = self.manager.leds_estado[parqueo_key]
+            if self._mascaras_mostradas.get(parqueo_key) == mascara:
+                continue
+            for i, btn in enumerate(botones):
+                self._cfg(btn, bg="red" if (mascara >> i) & 1 else "lightgray")
+            self._mascaras_mostradas[parqueo_key] = mascara
+    
+    def _cfg(self, widget, **opciones):
+        """Configurar un widget aplicando solo las opciones que cambiaron desde la última vez"""
+        cambios = {}
+        for opcion, valor in opciones.items():
+            clave = (id(widget), opcion)
+            if self._config_widgets.get(clave) != valor:
+                cambios[opcion] = valor
+                self._config_widgets[clave] = valor
+        if cambios:
+            widget.configure(cambios)
+    
+    def _al_minimizar(self, evento):
+        """Pausar la actualización periódica al minimizar la ventana principal"""
+        if evento.widget is self.root:  # <Unmap> también llega por los widgets hijos
+            self._pausado = True
+    
+    def _al_restaurar(self, evento):
+        """Reanudar la actualización periódica y refrescar al restaurar la ventana principal"""
+        if evento.widget is self.root and self._pausado:
+            self._pausado = False
+            self.actualizar_display()
     
     def actualizar_periodico(self):
         """Actualización periódica de la interfaz"""
+        if self._pausado:
+            # Nadie ve la interfaz: ni redibujar ni verificar conexiones
+            self.root.after(1000, self.actualizar_periodico)
+            return
+        
         self.actualizar_display()
         
         # Verificar conexiones cada 5 segundos
@@ -703,77 +1148,74 @@ class ParqueoGUI:
         
         self.root.after(1000, self.actualizar_periodico)
     
+    def guardar_snapshot_periodico(self):
+        """Guardar snapshot de los datos periódicamente"""
+        self.manager.guardar_snapshot()
+        self.root.after(INTERVALO_SNAPSHOT_MS, self.guardar_snapshot_periodico)
+    
     def verificar_conexiones_silencioso(self):
-        """Verificar conexiones sin mostrar mensajes (para uso periódico)"""
-        try:
-            conexiones_previas = dict(self.manager.conexiones_raspberry)
-            
-            # Verificar ambas conexiones de forma rápida
-            for parqueo in [1, 2]:
-                parqueo_key = f"parqueo{parqueo}"
-                ip = self.manager.ips_raspberry[parqueo_key]
-                puerto = self.manager.puertos_raspberry[parqueo_key]
-                
-                try:
-                    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-                        s.settimeout(2)  # Timeout corto para verificación rápida
-                        s.connect((ip, puerto))
-                        s.send("ESTADO".encode('utf-8'))
-                        response = s.recv(1024).decode('utf-8')
-                        if "ESTADO_OK" in response or "OK" in response:
-                            self.manager.conexiones_raspberry[parqueo_key] = True
-                        else:
-                            self.manager.conexiones_raspberry[parqueo_key] = False
-                except:
-                    self.manager.conexiones_raspberry[parqueo_key] = False
-            
-            # Actualizar indicadores visuales si hay cambios
-            if conexiones_previas != self.manager.conexiones_raspberry:
-                self.actualizar_indicadores_conexion()
-                
-        except Exception as e:
-            print(f"Error en verificación periódica: {e}")
+        """Verificar conexiones sin mostrar mensajes (para uso periódico, sin bloquear la interfaz)"""
+        if self._verificacion_en_curso:
+            return  # La verificación anterior sigue en curso
+        self._verificacion_en_curso = True
+        conexiones_previas = dict(self.manager.conexiones_raspberry)
+        
+        def verificar():
+            try:
+                # Verificar ambas conexiones de forma rápida (usa las conexiones persistentes:
+                # los parqueos atienden un solo cliente a la vez)
+                self.manager.verificar_todas_conexiones(timeout=2)  # Timeout corto
+            except Exception:
+                log.exception("Error en verificación periódica")
+            return conexiones_previas
+        
+        self._en_segundo_plano(verificar, self._aplicar_verificacion_silenciosa)
+    
+    def _aplicar_verificacion_silenciosa(self, conexiones_previas):
+        """Actualizar indicadores visuales si la verificación periódica cambió alguna conexión"""
+        self._verificacion_en_curso = False
+        if conexiones_previas != self.manager.conexiones_raspberry:
+            self._programar_indicadores()
+    
+    def _programar_indicadores(self):
+        """Agrupar en un solo repintado, en el próximo ciclo ocioso de Tk, los cambios de conexión"""
+        if not self._indicadores_programados:
+            self._indicadores_programados = True
+            self.root.after_idle(self._repintar_indicadores)
+    
+    def _repintar_indicadores(self):
+        """Aplicar los cambios de conexión acumulados"""
+        self._indicadores_programados = False
+        self.actualizar_indicadores_conexion()
+    
+    def _aplicar_estado_conexion(self):
+        """Reflejar la conexión de cada parqueo en su indicador, sus botones de barrera y el combo"""
+        parqueos_disponibles = []
+        for parqueo, parqueo_key in enumerate(PKEY, 1):
+            conectado = self.manager.conexiones_raspberry.get(parqueo_key, False)
+            self._cfg(self._labels_conexion[parqueo_key], fg="green" if conectado else "red")
+            estado = tk.NORMAL if conectado else tk.DISABLED
+            for btn in self._btns[parqueo_key]:
+                self._cfg(btn, state=estado)
+            if conectado:
+                parqueos_disponibles.append(str(parqueo))
+        
+        # Mostrar en el combo solo los parqueos disponibles
+        if parqueos_disponibles:
+            self._cfg(self.combo_parqueo, values=tuple(parqueos_disponibles))
+            # Mantener selección si sigue disponible, sino seleccionar el primero disponible
+            if self.combo_parqueo.get() not in parqueos_disponibles:
+                self.combo_parqueo.set(parqueos_disponibles[0])
+        else:
+            self._cfg(self.combo_parqueo, values=("Sin conexión",))
     
     def actualizar_indicadores_conexion(self):
         """Actualizar los indicadores visuales de conexión en la interfaz principal"""
-        if hasattr(self, 'label_conexion1') and hasattr(self, 'label_conexion2'):
-            # Actualizar indicador Parqueo 1
+        self._aplicar_estado_conexion()
+        if log.isEnabledFor(logging.DEBUG):
             color1 = "green" if self.manager.conexiones_raspberry.get("parqueo1", False) else "red"
-            self.label_conexion1.config(fg=color1)
-            
-            # Actualizar indicador Parqueo 2  
             color2 = "green" if self.manager.conexiones_raspberry.get("parqueo2", False) else "red"
-            self.label_conexion2.config(fg=color2)
-            
-            # Habilitar/deshabilitar botones según conexión
-            estado1 = "normal" if self.manager.conexiones_raspberry.get("parqueo1", False) else "disabled"
-            estado2 = "normal" if self.manager.conexiones_raspberry.get("parqueo2", False) else "disabled"
-            
-            if hasattr(self, 'btn_abrir_p1'):
-                self.btn_abrir_p1.config(state=estado1)
-                self.btn_subir_p1.config(state=estado1)
-                self.btn_bajar_p1.config(state=estado1)
-                
-            if hasattr(self, 'btn_abrir_p2'):
-                self.btn_abrir_p2.config(state=estado2)
-                self.btn_subir_p2.config(state=estado2)  
-                self.btn_bajar_p2.config(state=estado2)
-            
-            # Actualizar combo de parqueos disponibles
-            parqueos_disponibles = []
-            if self.manager.conexiones_raspberry.get("parqueo1", False):
-                parqueos_disponibles.append("1")
-            if self.manager.conexiones_raspberry.get("parqueo2", False):
-                parqueos_disponibles.append("2")
-            
-            if hasattr(self, 'combo_parqueo') and parqueos_disponibles:
-                valor_actual = self.combo_parqueo.get()
-                self.combo_parqueo['values'] = parqueos_disponibles
-                # Mantener selección si sigue disponible, sino seleccionar el primero disponible
-                if valor_actual not in parqueos_disponibles:
-                    self.combo_parqueo.set(parqueos_disponibles[0])
-                    
-            print(f"Indicadores actualizados - P1: {color1}, P2: {color2}")
+            log.debug("Indicadores actualizados - P1: %s, P2: %s", color1, color2)
     
     def registrar_entrada(self):
         """Registrar entrada de vehículo"""
@@ -783,7 +1225,7 @@ class ParqueoGUI:
             return
         
         parqueo = int(self.combo_parqueo.get())
-        parqueo_key = f"parqueo{parqueo}"
+        parqueo_key = PKEY[parqueo - 1]
         
         # Verificar si el parqueo seleccionado está conectado
         if not self.manager.conexiones_raspberry.get(parqueo_key, False):
@@ -817,15 +1259,25 @@ class ParqueoGUI:
     
     def controlar_barrera(self, accion, parqueo=1):
         """Controlar la barrera remotamente"""
-        parqueo_key = f"parqueo{parqueo}"
+        parqueo_key = PKEY[parqueo - 1]
+        
+        # Botón ya deshabilitado (p. ej. activado con el teclado): no hay nada que hacer ni mostrar.
+        # Se consulta el último estado aplicado con _cfg, sin preguntarle a Tk
+        if self._config_widgets.get((id(self._btns[parqueo_key][0]), "state")) == tk.DISABLED:
+            return
         
         # Verificar si el parqueo está conectado
         if not self.manager.conexiones_raspberry.get(parqueo_key, False):
-            messagebox.showerror("Error", f"Parqueo {parqueo} no está conectado. No se puede ejecutar el comando.")
+            messagebox.showerror("Error", MSG_BARRERA_DESCONECTADA[parqueo])
             return
         
-        exito, respuesta = self.manager.controlar_barrera(accion, parqueo)
-        
+        self._en_segundo_plano(self.manager.controlar_barrera,
+                               lambda resultado: self._mostrar_resultado_barrera(accion, parqueo, resultado),
+                               accion, parqueo)
+    
+    def _mostrar_resultado_barrera(self, accion, parqueo, resultado):
+        """Mostrar la respuesta de la Raspberry Pi a un comando de barrera"""
+        exito, respuesta = resultado
         if exito:
             messagebox.showinfo("Barrera", f"Parqueo {parqueo} - Comando enviado: {accion}\nRespuesta: {respuesta}")
         else:
@@ -833,32 +1285,23 @@ class ParqueoGUI:
     
     def toggle_led(self, parqueo, espacio):
         """Cambiar estado de LED"""
-        parqueo_key = f"parqueo{parqueo}"
+        parqueo_key = PKEY[parqueo - 1]
         
         # Verificar si el parqueo está conectado
         if not self.manager.conexiones_raspberry.get(parqueo_key, False):
-            messagebox.showerror("Error", f"Parqueo {parqueo} no está conectado. No se puede controlar el LED.")
+            messagebox.showerror("Error", MSG_LED_DESCONECTADO[parqueo])
             return
         
         if self.manager.toggle_led(parqueo, espacio):
-            estado = "OCUPADO" if self.manager.leds_estado[f"parqueo{parqueo}"][espacio] else "LIBRE"
+            estado = "OCUPADO" if self.manager.led_ocupado(parqueo, espacio) else "LIBRE"
             messagebox.showinfo("LED Control", f"Parqueo {parqueo}, Espacio {espacio+1}: {estado}")
     
     def actualizar_estadisticas(self):
         """Actualizar y mostrar estadísticas"""
         stats = self.manager.obtener_estadisticas()
         
-        # Limpiar frame anterior
-        for widget in self.frame_stats_content.winfo_children():
-            widget.destroy()
-        
-        # Crear tabla de estadísticas
-        headers = ["Métrica", "Parqueo 1", "Parqueo 2", "Total"]
-        
-        # Crear encabezados
-        for col, header in enumerate(headers):
-            tk.Label(self.frame_stats_content, text=header, font=("Arial", 12, "bold"), 
-                    relief=tk.RIDGE, width=15).grid(row=0, column=col, sticky="nsew", padx=1, pady=1)
+        if not self._celdas_stats:
+            self._construir_tabla_estadisticas()
         
         # Datos de estadísticas
         filas = [
@@ -867,10 +1310,28 @@ class ParqueoGUI:
             ("Ganancias ($)", f"${stats['ganancias_dolares']['parqueo1']:.2f}", f"${stats['ganancias_dolares']['parqueo2']:.2f}", f"${stats['ganancias_dolares']['total']:.2f}")
         ]
         
-        for row, datos in enumerate(filas, 1):
-            for col, dato in enumerate(datos):
-                tk.Label(self.frame_stats_content, text=str(dato), font=("Arial", 10),
-                        relief=tk.RIDGE, width=15).grid(row=row, column=col, sticky="nsew", padx=1, pady=1)
+        # Solo cambiar el texto de las celdas existentes
+        for celdas, datos in zip(self._celdas_stats, filas):
+            for celda, dato in zip(celdas, datos):
+                self._cfg(celda, text=str(dato))
+    
+    def _construir_tabla_estadisticas(self):
+        """Crear una sola vez los encabezados y las celdas de la tabla de estadísticas"""
+        headers = ["Métrica", "Parqueo 1", "Parqueo 2", "Total"]
+        
+        # Crear encabezados
+        for col, header in enumerate(headers):
+            tk.Label(self.frame_stats_content, text=header, font=("Arial", 12, "bold"), 
+                    relief=tk.RIDGE, width=15).grid(row=0, column=col, sticky="nsew", padx=1, pady=1)
+        
+        # Celdas de datos (3 filas), su texto se asigna en actualizar_estadisticas
+        for row in range(1, 4):
+            celdas = []
+            for col in range(len(headers)):
+                celda = tk.Label(self.frame_stats_content, font=("Arial", 10), relief=tk.RIDGE, width=15)
+                celda.grid(row=row, column=col, sticky="nsew", padx=1, pady=1)
+                celdas.append(celda)
+            self._celdas_stats.append(celdas)
         
         # Configurar expansión de columnas
         for i in range(len(headers)):
@@ -878,11 +1339,14 @@ class ParqueoGUI:
     
     def run(self):
         """Ejecutar la aplicación"""
-        if hasattr(self, 'conexion_exitosa') and self.conexion_exitosa:
-            self.root.mainloop()
-        else:
-            print("Conexión cancelada o fallida. Cerrando aplicación.")
-            self.root.quit()
+        try:
+            if hasattr(self, 'conexion_exitosa') and self.conexion_exitosa:
+                self.root.mainloop()
+            else:
+                print("Conexión cancelada o fallida. Cerrando aplicación.")
+                self.root.quit()
+        finally:
+            self.manager.cerrar()
 
 if __name__ == "__main__":
     try:
@@ -12,24 +12,50 @@ Componentes del sistema:
 - Comunicación WiFi: Control remoto desde GUI
 """
 
-from machine import Pin, PWM, ADC
+from machine import Pin, PWM, ADC, Timer, mem32
+import micropython
+from micropython import const
 import time
 import socket
 import network
-import json
 import _thread
+try:
+    from collections import OrderedDict
+except ImportError:
+    from ucollections import OrderedDict  # Firmwares de MicroPython antiguos
+
+micropython.alloc_emergency_exception_buf(100)  # Permite reportar errores dentro de una ISR
+
+# Mensajes de detalle por consola (botones, barrera, comandos remotos); cada print
+# bloquea hasta vaciar la UART, así que se apagan por defecto. Poner en 1 para depurar.
+DEPURACION = const(0)
+
+def log(*args):
+    """Imprimir un mensaje de detalle solo si DEPURACION está activo"""
+    if DEPURACION:
+        print(*args)
 
 # ========== CONFIGURACIÓN DE RED ==========
 SSID = "Admiti q sos pobre"
 PASSWORD = "soy pobre"
-PUERTO_SERVIDOR = 1719  # Puerto específico para Parqueo 2
-PARQUEO_ID = 2
+PUERTO_SERVIDOR = const(1719)  # Puerto específico para Parqueo 2
+PARQUEO_ID = const(2)
+ESPERA_WIFI_MS = const(10000)  # Tiempo máximo para obtener conexión WiFi
+WIFI_SIN_AHORRO = const(0xa11140)  # Modo de energía del CYW43 sin ahorro (menor latencia)
+TAM_RECV = const(64)  # Bytes leídos por recv; los comandos son líneas cortas
+TAM_MAX_COMANDO = const(128)  # Se descarta una línea que crece más que esto sin \n
+COLA_CONEXIONES = const(4)  # Conexiones pendientes que acepta listen()
+INACTIVIDAD_CLIENTE_S = const(60)  # Se cierra un cliente que no envía comandos en este tiempo
 
 # ========== CONFIGURACIÓN DE PINES ==========
 # Servomotor (barrera)
-SERVO_PIN = 28
+SERVO_PIN = const(28)
+TIEMPO_PASO_MS = const(5000)  # Tiempo que la barrera queda abierta para que pase el vehículo
+TIEMPO_PASO_REMOTO_MS = const(3000)  # Ídem para el comando remoto ABRIR_PASO
 
 # Display 7 segmentos (ánodo común)
+PARPADEOS_LLENO = const(3)  # Parpadeos del display cuando el parqueo está lleno
+INTERVALO_PARPADEO_MS = const(300)
 DISPLAY_PINS = {
     'a': 2,   # Segmento A
     'b': 3,   # Segmento B
@@ -42,20 +68,41 @@ DISPLAY_PINS = {
 }
 
 # Botones
-BOTON_INGRESO = 10
-BOTON_PAGO = 11
+BOTON_INGRESO = const(10)
+BOTON_PAGO = const(11)
+ANTIRREBOTE_MS = const(500)  # Ignorar pulsaciones hasta 500 ms después de atender la anterior
 
 # LEDs indicadores de espacios
-LED_ESPACIO_1 = 12
-LED_ESPACIO_2 = 13
+LED_ESPACIO_1 = const(12)
+LED_ESPACIO_2 = const(13)
 
 # Fotoresistencias (ADC)
-FOTO_ESPACIO_1 = 26  # ADC0
-FOTO_ESPACIO_2 = 27  # ADC1
+FOTO_ESPACIO_1 = const(26)  # ADC0
+FOTO_ESPACIO_2 = const(27)  # ADC1
+
+# Actualización periódica de LEDs desde las fotoresistencias
+INTERVALO_LEDS_MS = const(100)
+MUESTRAS_FILTRO = const(5)  # Mediana de las últimas 5 lecturas de cada fotoresistencia
+
+# ========== RESPUESTAS REMOTAS ==========
+# Respuestas fijas ya codificadas y terminadas en \n, listas para enviar
+RESP_SUBIR = f"Parqueo {PARQUEO_ID} - Barrera abierta remotamente\n".encode('utf-8')
+RESP_BAJAR = f"Parqueo {PARQUEO_ID} - Barrera cerrada remotamente\n".encode('utf-8')
+RESP_PASO = f"Parqueo {PARQUEO_ID} - Secuencia de paso iniciada\n".encode('utf-8')
+RESP_INGRESO_OK = f"Parqueo {PARQUEO_ID} - Ingreso remoto procesado exitosamente\n".encode('utf-8')
+RESP_INGRESO_DENEGADO = f"Parqueo {PARQUEO_ID} - Ingreso remoto denegado - Sin espacios disponibles\n".encode('utf-8')
+RESP_PAGO_OK = f"Parqueo {PARQUEO_ID} - Pago remoto procesado exitosamente\n".encode('utf-8')
+RESP_PAGO_SIN_VEHICULOS = f"Parqueo {PARQUEO_ID} - No hay vehículos para procesar pago\n".encode('utf-8')
+RESP_DESCONOCIDO = f"Parqueo {PARQUEO_ID} - Comando no reconocido: ".encode('utf-8')  # + comando + \n
+
+# Plantilla JSON de la respuesta a ESTADO (se llena con %, sin armar un dict)
+ESTADO_FMT = ('{"parqueo_id":%d,"espacios_disponibles":%d,"vehiculos_activos":%d,'
+              '"espacio1_ocupado":%s,"espacio2_ocupado":%s,"barrera_abierta":%s,"modo_pago":%s}\n')
 
 # ========== CONFIGURACIÓN DE TARIFAS ==========
-TARIFA_POR_10_SEGUNDOS = 1000  # Colones
-UMBRAL_FOTORESISTENCIA = 30000  # Valor para detectar ocupación
+ESPACIOS_TOTALES = const(2)  # También es el máximo de vehículos registrados a la vez
+TARIFA_POR_10_SEGUNDOS = const(1000)  # Colones
+UMBRAL_FOTORESISTENCIA = const(30000)  # Valor para detectar ocupación
 
 # ========== PATRONES PARA DISPLAY 7 SEGMENTOS ==========
 # Patrones para números 0-9 (ánodo común - 0=encendido, 1=apagado)
@@ -72,17 +119,59 @@ DIGITOS_7SEG = {
     9: {'a': 0, 'b': 0, 'c': 0, 'd': 0, 'e': 1, 'f': 0, 'g': 0}   # 9
 }
 
+# Registros SIO del RP2040 para escribir varios pines GPIO en una sola operación
+SIO_GPIO_OUT_SET = 0xd0000014
+SIO_GPIO_OUT_CLR = 0xd0000018
+
+# Bits GPIO de los segmentos a-g (el punto decimal no se toca)
+MASCARA_SEGMENTOS = 0
+for _seg in 'abcdefg':
+    MASCARA_SEGMENTOS |= 1 << DISPLAY_PINS[_seg]
+
+# Bits GPIO que quedan en 1 (apagados) para cada dígito, precalculados desde DIGITOS_7SEG
+MASCARAS_DIGITOS = []
+for _num in range(10):
+    _mascara = 0
+    for _seg in 'abcdefg':
+        if DIGITOS_7SEG[_num][_seg]:
+            _mascara |= 1 << DISPLAY_PINS[_seg]
+    MASCARAS_DIGITOS.append(_mascara)
+MASCARAS_DIGITOS = tuple(MASCARAS_DIGITOS)
+
+# Bits GPIO que quedan en 0 (encendidos) para cada dígito
+MASCARAS_ENCENDIDOS = tuple(MASCARA_SEGMENTOS & ~_m for _m in MASCARAS_DIGITOS)
+
+# Bits GPIO de los LEDs de espacio y LEDs encendidos (libres) para cada estado de
+# ocupación, indexado por ocupado1 | (ocupado2 << 1)
+MASCARA_LEDS = (1 << LED_ESPACIO_1) | (1 << LED_ESPACIO_2)
+MASCARAS_LEDS = (
+    MASCARA_LEDS,           # Ambos libres
+    1 << LED_ESPACIO_2,     # Espacio 1 ocupado
+    1 << LED_ESPACIO_1,     # Espacio 2 ocupado
+    0                       # Ambos ocupados
+)
+
 class ParqueoInteligente2:
     """Clase principal para manejar el Parqueo 2"""
     
     def __init__(self):
-        self.inicializar_hardware()
-        self.espacios_disponibles = 2
-        self.vehiculos_activos = {}  # ID_temp -> tiempo_entrada
+        self.espacios_disponibles = ESPACIOS_TOTALES
+        # ID_temp -> tiempo_entrada (ticks_ms), en orden de llegada (el dict de MicroPython
+        # no conserva el orden de inserción)
+        self.vehiculos_activos = OrderedDict()
         self.id_vehiculo_actual = 1
         self.modo_pago = False
         self.vehiculo_pagando = None
         self.barrera_abierta = False
+        self._timer_barrera = None  # Cierre automático pendiente
+        self._timer_parpadeo = None  # Parpadeo de "lleno" en curso
+        self._pasos_parpadeo = 0
+        self._ultima_pulsacion = time.ticks_ms()
+        # Protege vehiculos_activos, modo_pago y vehiculo_pagando entre los botones
+        # (núcleo 0) y el servidor remoto (hilo en el núcleo 1)
+        self._lock = _thread.allocate_lock()
+        # El hardware va al final: sus interrupciones y la lectura inicial usan el estado anterior
+        self.inicializar_hardware()
         
     def inicializar_hardware(self):
         """Inicializar todos los componentes de hardware"""
@@ -94,15 +183,22 @@ class ParqueoInteligente2:
         self.servo.duty_ns(1700000)  # Posición cerrada inicial
         
         # Display 7 segmentos
+        # Los pines quedan configurados como salida y apagados (en 1) desde el inicio;
+        # luego se escriben todos juntos con los registros SIO
         self.display_pins = {}
         for segmento, pin_num in DISPLAY_PINS.items():
-            self.display_pins[segmento] = Pin(pin_num, Pin.OUT)
-            self.display_pins[segmento].value(1)  # Apagar todos los segmentos
+            self.display_pins[segmento] = Pin(pin_num, Pin.OUT, value=1)
         
         # Botones (con pull-up interno)
         self.boton_ingreso = Pin(BOTON_INGRESO, Pin.IN, Pin.PULL_UP)
         self.boton_pago = Pin(BOTON_PAGO, Pin.IN, Pin.PULL_UP)
         
+        # Interrupción por flanco descendente (presión); la referencia al método se crea
+        # aquí porque la ISR no puede reservar memoria
+        self._atender_boton_ref = self._atender_boton
+        self.boton_ingreso.irq(trigger=Pin.IRQ_FALLING, handler=self._isr_boton, hard=True)
+        self.boton_pago.irq(trigger=Pin.IRQ_FALLING, handler=self._isr_boton, hard=True)
+        
         # LEDs
         self.led_espacio1 = Pin(LED_ESPACIO_1, Pin.OUT)
         self.led_espacio2 = Pin(LED_ESPACIO_2, Pin.OUT)
@@ -111,31 +207,76 @@ class ParqueoInteligente2:
         self.foto_espacio1 = ADC(Pin(FOTO_ESPACIO_1))
         self.foto_espacio2 = ADC(Pin(FOTO_ESPACIO_2))
         
+        # Últimas lecturas de cada fotoresistencia para el filtro de mediana
+        self._muestras1 = [self.foto_espacio1.read_u16()] * MUESTRAS_FILTRO
+        self._muestras2 = [self.foto_espacio2.read_u16()] * MUESTRAS_FILTRO
+        self._indice_muestra = 0
+        self._estado_leds = -1  # Último estado escrito en los LEDs (ninguno aún)
+        self._display_espacios = False  # El display muestra los espacios (no costo ni parpadeo)
+        
         # Estado inicial
         self.actualizar_leds()
         self.mostrar_espacios_disponibles()
         
         print(f"Hardware del Parqueo {PARQUEO_ID} inicializado correctamente")
     
+    @micropython.native
     def mostrar_en_display(self, numero):
         """Mostrar número en display 7 segmentos (0-9)"""
         if numero < 0 or numero > 9:
             numero = 0
             
-        patron = DIGITOS_7SEG[numero]
-        
-        for segmento in ['a', 'b', 'c', 'd', 'e', 'f', 'g']:
-            self.display_pins[segmento].value(patron[segmento])
+        mem32[SIO_GPIO_OUT_SET] = MASCARAS_DIGITOS[numero]  # Segmentos apagados
+        mem32[SIO_GPIO_OUT_CLR] = MASCARAS_ENCENDIDOS[numero]  # Segmentos encendidos
+    
+    def apagar_display(self):
+        """Apagar todos los segmentos del display"""
+        mem32[SIO_GPIO_OUT_SET] = MASCARA_SEGMENTOS
+    
+    def iniciar_parpadeo(self):
+        """Parpadear el display en 0 sin bloquear para indicar que está lleno"""
+        self.detener_parpadeo()
+        self._display_espacios = False
+        self._pasos_parpadeo = 2 * PARPADEOS_LLENO
+        self.mostrar_en_display(0)
+        self._timer_parpadeo = Timer(period=INTERVALO_PARPADEO_MS, mode=Timer.PERIODIC,
+                                     callback=self._paso_parpadeo)
+    
+    def detener_parpadeo(self):
+        """Cancelar el parpadeo en curso, si lo hay"""
+        if self._timer_parpadeo is not None:
+            self._timer_parpadeo.deinit()
+            self._timer_parpadeo = None
+    
+    def _paso_parpadeo(self, timer):
+        """Alternar el display entre 0 y apagado; al terminar, volver a los espacios"""
+        self._pasos_parpadeo -= 1
+        if self._pasos_parpadeo == 0:
+            self.detener_parpadeo()
+            self.mostrar_espacios_disponibles()
+        elif self._pasos_parpadeo % 2:
+            self.apagar_display()
+        else:
+            self.mostrar_en_display(0)
     
     def mostrar_espacios_disponibles(self):
         """Mostrar espacios disponibles en el display"""
         self.mostrar_en_display(self.espacios_disponibles)
-        print(f"Parqueo {PARQUEO_ID} - Display: {self.espacios_disponibles} espacios disponibles")
+        self._display_espacios = True
+        log(f"Parqueo {PARQUEO_ID} - Display: {self.espacios_disponibles} espacios disponibles")
     
+    def muestrear_fotoresistencias(self):
+        """Guardar una lectura nueva de cada fotoresistencia en el filtro"""
+        i = self._indice_muestra
+        self._muestras1[i] = self.foto_espacio1.read_u16()
+        self._muestras2[i] = self.foto_espacio2.read_u16()
+        self._indice_muestra = (i + 1) % MUESTRAS_FILTRO
+    
+    @micropython.native
     def leer_fotoresistencias(self):
-        """Leer estado de las fotoresistencias"""
-        valor1 = self.foto_espacio1.read_u16()
-        valor2 = self.foto_espacio2.read_u16()
+        """Leer estado de las fotoresistencias (mediana de las últimas muestras)"""
+        valor1 = sorted(self._muestras1)[MUESTRAS_FILTRO // 2]
+        valor2 = sorted(self._muestras2)[MUESTRAS_FILTRO // 2]
         
         # True = ocupado, False = libre
         ocupado1 = valor1 < UMBRAL_FOTORESISTENCIA
@@ -143,78 +284,93 @@ class ParqueoInteligente2:
         
         return ocupado1, ocupado2
     
+    @micropython.native
     def actualizar_leds(self):
         """Actualizar LEDs según disponibilidad de espacios"""
+        self.muestrear_fotoresistencias()
         ocupado1, ocupado2 = self.leer_fotoresistencias()
         
-        # LED encendido = espacio libre, LED apagado = espacio ocupado
-        self.led_espacio1.value(0 if ocupado1 else 1)
-        self.led_espacio2.value(0 if ocupado2 else 1)
+        # LED encendido = espacio libre, LED apagado = espacio ocupado; ambos LEDs
+        # se escriben juntos en los registros SIO y solo cuando el estado cambia
+        estado = int(ocupado1) | (int(ocupado2) << 1)
+        if estado != self._estado_leds:
+            encendidos = MASCARAS_LEDS[estado]
+            mem32[SIO_GPIO_OUT_SET] = encendidos
+            mem32[SIO_GPIO_OUT_CLR] = MASCARA_LEDS & ~encendidos
+            self._estado_leds = estado
         
         # Actualizar contador de espacios
-        espacios_ocupados = sum([ocupado1, ocupado2])
-        self.espacios_disponibles = 2 - espacios_ocupados
+        espacios_ocupados = int(ocupado1) + int(ocupado2)
+        espacios = ESPACIOS_TOTALES - espacios_ocupados
+        if espacios != self.espacios_disponibles:
+            self.espacios_disponibles = espacios
+            # Reflejar el cambio en el display si está mostrando los espacios
+            if self._display_espacios:
+                self.mostrar_en_display(espacios)
     
     def abrir_barrera(self):
         """Abrir barrera del parqueo"""
-        print(f"Parqueo {PARQUEO_ID} - Abriendo barrera...")
+        log(f"Parqueo {PARQUEO_ID} - Abriendo barrera...")
         self.servo.duty_ns(800000)  # Posición abierta
         self.barrera_abierta = True
     
     def cerrar_barrera(self):
         """Cerrar barrera del parqueo"""
-        print(f"Parqueo {PARQUEO_ID} - Cerrando barrera...")
+        log(f"Parqueo {PARQUEO_ID} - Cerrando barrera...")
         self.servo.duty_ns(1700000)  # Posición cerrada
         self.barrera_abierta = False
+        self.cancelar_cierre_barrera()
+    
+    def cancelar_cierre_barrera(self):
+        """Cancelar el cierre automático pendiente, si lo hay"""
+        if self._timer_barrera is not None:
+            self._timer_barrera.deinit()
+            self._timer_barrera = None
+    
+    def programar_cierre_barrera(self, ms=TIEMPO_PASO_MS):
+        """Cerrar la barrera después de ms milisegundos sin bloquear el programa"""
+        self.cancelar_cierre_barrera()  # Reiniciar la cuenta si ya había un cierre pendiente
+        self._timer_barrera = Timer(period=ms, mode=Timer.ONE_SHOT,
+                                    callback=lambda t: self.cerrar_barrera())
     
     def procesar_ingreso(self):
         """Procesar solicitud de ingreso"""
-        if self.espacios_disponibles > 0:
-            print(f"Parqueo {PARQUEO_ID} - Vehículo {self.id_vehiculo_actual} solicitando ingreso...")
+        # Las fotoresistencias tardan en ver al vehículo que acaba de entrar: también
+        # se limita por vehículos registrados, así el registro nunca pasa de ESPACIOS_TOTALES
+        if self.espacios_disponibles > 0 and len(self.vehiculos_activos) < ESPACIOS_TOTALES:
+            log(f"Parqueo {PARQUEO_ID} - Vehículo {self.id_vehiculo_actual} solicitando ingreso...")
             
             # Registrar vehículo
-            self.vehiculos_activos[self.id_vehiculo_actual] = time.time()
+            self.vehiculos_activos[self.id_vehiculo_actual] = time.ticks_ms()
             
-            # Abrir barrera
+            # Abrir barrera y cerrarla cuando el vehículo haya pasado
             self.abrir_barrera()
-            print(f"Parqueo {PARQUEO_ID} - Ingreso autorizado para vehículo {self.id_vehiculo_actual}")
-            
-            # Esperar que el vehículo pase
-            time.sleep(5)
-            
-            # Cerrar barrera
-            self.cerrar_barrera()
+            log(f"Parqueo {PARQUEO_ID} - Ingreso autorizado para vehículo {self.id_vehiculo_actual}")
+            self.programar_cierre_barrera()
             
             # Actualizar display
-            self.actualizar_leds()
             self.mostrar_espacios_disponibles()
             
             self.id_vehiculo_actual += 1
             return True
         else:
-            print(f"Parqueo {PARQUEO_ID} - Ingreso denegado: No hay espacios disponibles")
+            log(f"Parqueo {PARQUEO_ID} - Ingreso denegado: No hay espacios disponibles")
             # Parpadear display para indicar que está lleno
-            for _ in range(3):
-                self.mostrar_en_display(0)
-                time.sleep(0.3)
-                # Apagar display
-                for segmento in ['a', 'b', 'c', 'd', 'e', 'f', 'g']:
-                    self.display_pins[segmento].value(1)
-                time.sleep(0.3)
-            self.mostrar_espacios_disponibles()
+            self.iniciar_parpadeo()
             return False
     
+    @micropython.native
     def calcular_costo(self, tiempo_entrada):
-        """Calcular costo de parqueo"""
-        tiempo_estancia = time.time() - tiempo_entrada
-        bloques_10_segundos = max(1, int(tiempo_estancia // 10) + (1 if tiempo_estancia % 10 > 0 else 0))
+        """Calcular costo de parqueo (tiempo_entrada en ticks_ms; estancia en segundos)"""
+        estancia_ms = time.ticks_diff(time.ticks_ms(), tiempo_entrada)
+        bloques_10_segundos = max(1, (estancia_ms + 9999) // 10000)  # Redondeo hacia arriba
         costo = bloques_10_segundos * TARIFA_POR_10_SEGUNDOS
-        return costo, tiempo_estancia
+        return costo, estancia_ms // 1000
     
     def procesar_pago(self):
         """Procesar solicitud de pago/salida"""
         if not self.vehiculos_activos:
-            print(f"Parqueo {PARQUEO_ID} - No hay vehículos para procesar pago")
+            log(f"Parqueo {PARQUEO_ID} - No hay vehículos para procesar pago")
             return False
         
         if not self.modo_pago:
@@ -222,23 +378,25 @@ class ParqueoInteligente2:
             self.modo_pago = True
             
             # Tomar el primer vehículo (FIFO)
-            vehiculo_id = min(self.vehiculos_activos.keys())
+            vehiculo_id = next(iter(self.vehiculos_activos))
             self.vehiculo_pagando = vehiculo_id
             tiempo_entrada = self.vehiculos_activos[vehiculo_id]
             
             costo, tiempo_estancia = self.calcular_costo(tiempo_entrada)
-            print(f"Parqueo {PARQUEO_ID} - Vehículo {vehiculo_id} - Tiempo: {tiempo_estancia:.0f}s - Costo: ₡{costo}")
+            log(f"Parqueo {PARQUEO_ID} - Vehículo {vehiculo_id} - Tiempo: {tiempo_estancia}s - Costo: ₡{costo}")
             
             # Mostrar costo en display (solo último dígito por simplicidad)
-            costo_display = int(str(int(costo/1000))[-1])  # Último dígito de miles
+            self.detener_parpadeo()
+            self._display_espacios = False
+            costo_display = (costo // 1000) % 10  # Último dígito de miles
             self.mostrar_en_display(costo_display)
             
-            print(f"Parqueo {PARQUEO_ID} - Presione nuevamente el botón de pago para completar la salida")
+            log(f"Parqueo {PARQUEO_ID} - Presione nuevamente el botón de pago para completar la salida")
             return True
             
         else:
             # Segunda presión: permitir salida
-            print(f"Parqueo {PARQUEO_ID} - Procesando salida del vehículo {self.vehiculo_pagando}")
+            log(f"Parqueo {PARQUEO_ID} - Procesando salida del vehículo {self.vehiculo_pagando}")
             
             # Abrir barrera
             self.abrir_barrera()
@@ -246,68 +404,74 @@ class ParqueoInteligente2:
             # Remover vehículo del registro
             del self.vehiculos_activos[self.vehiculo_pagando]
             
-            print(f"Parqueo {PARQUEO_ID} - Salida autorizada para vehículo {self.vehiculo_pagando}")
-            
-            # Esperar que el vehículo salga
-            time.sleep(5)
+            log(f"Parqueo {PARQUEO_ID} - Salida autorizada para vehículo {self.vehiculo_pagando}")
             
-            # Cerrar barrera
-            self.cerrar_barrera()
+            # Cerrar barrera cuando el vehículo haya salido
+            self.programar_cierre_barrera()
             
             # Resetear modo pago
             self.modo_pago = False
             self.vehiculo_pagando = None
             
             # Actualizar display
-            self.actualizar_leds()
             self.mostrar_espacios_disponibles()
             
             return True
     
-    def monitorear_botones(self):
-        """Monitorear presión de botones"""
-        estado_anterior_ingreso = 1
-        estado_anterior_pago = 1
+    def _isr_boton(self, pin):
+        """Interrupción de un botón: solo agenda la atención fuera de la ISR"""
+        try:
+            micropython.schedule(self._atender_boton_ref, pin)
+        except RuntimeError:
+            pass  # Cola de tareas llena (rebote): se descarta
+    
+    def _atender_boton(self, pin):
+        """Atender la presión de un botón (ejecutado por el planificador en el hilo principal)"""
+        # Antirrebote: también descarta las pulsaciones hechas mientras se atendía la anterior
+        if time.ticks_diff(time.ticks_ms(), self._ultima_pulsacion) < ANTIRREBOTE_MS:
+            return
         
-        while True:
-            # Leer estado actual de botones
-            estado_ingreso = self.boton_ingreso.value()
-            estado_pago = self.boton_pago.value()
-            
-            # Detectar presión del botón de ingreso (flanco descendente)
-            if estado_anterior_ingreso == 1 and estado_ingreso == 0:
-                print(f"Parqueo {PARQUEO_ID} - Botón de INGRESO presionado")
+        # Los LEDs se refrescan aquí, en el núcleo 0 como el temporizador, y no dentro de
+        # procesar_ingreso/procesar_pago: el servidor remoto las llama desde el núcleo 1
+        # y ahí se deja la actualización al temporizador
+        self.actualizar_leds()
+        
+        if pin is self.boton_ingreso:
+            log(f"Parqueo {PARQUEO_ID} - Botón de INGRESO presionado")
+            with self._lock:
                 self.procesar_ingreso()
-                time.sleep(0.5)  # Debounce
-            
-            # Detectar presión del botón de pago (flanco descendente)
-            if estado_anterior_pago == 1 and estado_pago == 0:
-                print(f"Parqueo {PARQUEO_ID} - Botón de PAGO presionado")
+        else:
+            log(f"Parqueo {PARQUEO_ID} - Botón de PAGO presionado")
+            with self._lock:
                 self.procesar_pago()
-                time.sleep(0.5)  # Debounce
-            
-            estado_anterior_ingreso = estado_ingreso
-            estado_anterior_pago = estado_pago
-            
-            # Actualizar LEDs periódicamente
-            self.actualizar_leds()
-            
-            time.sleep(0.1)
+        
+        self._ultima_pulsacion = time.ticks_ms()
+    
+    def monitorear_botones(self):
+        """Monitorear botones (por interrupciones) y LEDs (por temporizador)"""
+        # Actualizar LEDs periódicamente
+        self._timer_leds = Timer(period=INTERVALO_LEDS_MS, mode=Timer.PERIODIC,
+                                 callback=lambda t: self.actualizar_leds())
+        
+        # Los botones y el temporizador se atienden mientras el hilo principal duerme
+        while True:
+            time.sleep(1)
     
     def conectar_wifi(self):
         """Conectar a WiFi"""
         wlan = network.WLAN(network.STA_IF)
         wlan.active(True)
+        # El ahorro de energía del WiFi retrasa las respuestas a la GUI
+        wlan.config(pm=WIFI_SIN_AHORRO)
         
         if not wlan.isconnected():
             print("Conectando a WiFi...")
             wlan.connect(SSID, PASSWORD)
             
-            for i in range(20):
-                if wlan.isconnected():
-                    break
-                print(".", end="")
-                time.sleep(0.5)
+            # Revisar cada 50 ms para seguir apenas haya conexión
+            limite = time.ticks_add(time.ticks_ms(), ESPERA_WIFI_MS)
+            while not wlan.isconnected() and time.ticks_diff(limite, time.ticks_ms()) > 0:
+                time.sleep_ms(50)
             
             if wlan.isconnected():
                 ip = wlan.ifconfig()[0]
@@ -321,52 +485,72 @@ class ParqueoInteligente2:
             print(f"Parqueo {PARQUEO_ID} ya conectado a WiFi. IP: {ip}")
             return ip
     
+    def _cmd_subir(self):
+        self.abrir_barrera()
+        self.cancelar_cierre_barrera()  # Queda abierta hasta un BAJAR
+        return RESP_SUBIR
+    
+    def _cmd_bajar(self):
+        self.cerrar_barrera()
+        return RESP_BAJAR
+    
+    def _cmd_abrir_paso(self):
+        self.abrir_barrera()
+        self.programar_cierre_barrera(TIEMPO_PASO_REMOTO_MS)
+        return RESP_PASO
+    
+    def _cmd_estado(self):
+        ocupado1, ocupado2 = self.leer_fotoresistencias()
+        estado = ESTADO_FMT % (
+            PARQUEO_ID,
+            self.espacios_disponibles,
+            len(self.vehiculos_activos),
+            "true" if ocupado1 else "false",
+            "true" if ocupado2 else "false",
+            "true" if self.barrera_abierta else "false",
+            "true" if self.modo_pago else "false"
+        )
+        return estado.encode('utf-8')
+    
+    def _cmd_ingreso_remoto(self):
+        with self._lock:
+            ok = self.procesar_ingreso()
+        if ok:
+            return RESP_INGRESO_OK
+        else:
+            return RESP_INGRESO_DENEGADO
+    
+    def _cmd_pago_remoto(self):
+        with self._lock:
+            ok = self.procesar_pago()
+        if ok:
+            return RESP_PAGO_OK
+        else:
+            return RESP_PAGO_SIN_VEHICULOS
+    
+    # Comando remoto (bytes) -> método que lo atiende
+    _COMANDOS = {
+        b"SUBIR": _cmd_subir,
+        b"BAJAR": _cmd_bajar,
+        b"ABRIR_PASO": _cmd_abrir_paso,
+        b"ESTADO": _cmd_estado,
+        b"INGRESO_REMOTO": _cmd_ingreso_remoto,
+        b"PAGO_REMOTO": _cmd_pago_remoto,
+    }
+    
     def procesar_comando_remoto(self, comando):
-        """Procesar comandos desde la aplicación GUI remota"""
-        comando = comando.strip().upper()
-        print(f"Parqueo {PARQUEO_ID} - Comando remoto recibido: {comando}")
+        """Procesar un comando (bytes) desde la aplicación GUI remota y devolver la respuesta en bytes"""
+        comando = comando.strip()
+        manejador = self._COMANDOS.get(comando)
+        if manejador is None:
+            comando = comando.upper()  # Los comandos en minúsculas también se aceptan
+            manejador = self._COMANDOS.get(comando)
         
-        if comando == "SUBIR":
-            self.abrir_barrera()
-            return f"Parqueo {PARQUEO_ID} - Barrera abierta remotamente"
-            
-        elif comando == "BAJAR":
-            self.cerrar_barrera()
-            return f"Parqueo {PARQUEO_ID} - Barrera cerrada remotamente"
-            
-        elif comando == "ABRIR_PASO":
-            self.abrir_barrera()
-            time.sleep(3)
-            self.cerrar_barrera()
-            return f"Parqueo {PARQUEO_ID} - Secuencia de paso completada"
-            
-        elif comando == "ESTADO":
-            ocupado1, ocupado2 = self.leer_fotoresistencias()
-            estado = {
-                "parqueo_id": PARQUEO_ID,
-                "espacios_disponibles": self.espacios_disponibles,
-                "vehiculos_activos": len(self.vehiculos_activos),
-                "espacio1_ocupado": ocupado1,
-                "espacio2_ocupado": ocupado2,
-                "barrera_abierta": self.barrera_abierta,
-                "modo_pago": self.modo_pago
-            }
-            return json.dumps(estado)
-            
-        elif comando == "INGRESO_REMOTO":
-            if self.procesar_ingreso():
-                return f"Parqueo {PARQUEO_ID} - Ingreso remoto procesado exitosamente"
-            else:
-                return f"Parqueo {PARQUEO_ID} - Ingreso remoto denegado - Sin espacios disponibles"
-                
-        elif comando == "PAGO_REMOTO":
-            if self.procesar_pago():
-                return f"Parqueo {PARQUEO_ID} - Pago remoto procesado exitosamente"
-            else:
-                return f"Parqueo {PARQUEO_ID} - No hay vehículos para procesar pago"
-                
-        else:
-            return f"Parqueo {PARQUEO_ID} - Comando no reconocido: {comando}"
+        log(f"Parqueo {PARQUEO_ID} - Comando remoto recibido:", comando)
+        
+        if manejador is None:
+            return RESP_DESCONOCIDO + comando + b"\n"
+        return manejador(self)
     
     def servidor_remoto(self):
         """Servidor para comunicación remota con GUI"""
@@ -376,30 +560,57 @@ class ParqueoInteligente2:
             return
         
         s = socket.socket()
+        # Permite volver a abrir el puerto enseguida tras un reinicio del servidor
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
         s.bind(('', PUERTO_SERVIDOR))
-        s.listen(1)
+        s.listen(COLA_CONEXIONES)
         print(f"Parqueo {PARQUEO_ID} - Servidor remoto iniciado en {ip}:{PUERTO_SERVIDOR}")
         
         while True:
+            conn = None
             try:
                 conn, addr = s.accept()
-                print(f"Parqueo {PARQUEO_ID} - Cliente remoto conectado desde: {addr}")
+                log(f"Parqueo {PARQUEO_ID} - Cliente remoto conectado desde: {addr}")
+                # Detectar clientes que desaparecen sin cerrar la conexión
+                conn.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+                if hasattr(socket, "TCP_NODELAY"):
+                    # Enviar cada respuesta de inmediato, sin esperar a juntar más datos
+                    conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                # Una GUI que desaparece sin cerrar dejaría al servidor esperando en recv y
+                # a su reconexión en la cola de listen: se libera tras un rato sin comandos
+                conn.settimeout(INACTIVIDAD_CLIENTE_S)
                 
+                # Acumular bytes y atender cada línea completa por separado, aunque
+                # varios comandos lleguen juntos en un mismo paquete
+                buf = b""
                 while True:
-                    data = conn.recv(1024)
+                    try:
+                        data = conn.recv(TAM_RECV)
+                    except OSError:
+                        print(f"Parqueo {PARQUEO_ID} - Cliente remoto inactivo o caído, cerrando conexión")
+                        break
                     if not data:
                         break
                     
-                    comando = data.decode('utf-8').strip()
-                    respuesta = self.procesar_comando_remoto(comando)
-                    conn.send(respuesta.encode('utf-8'))
-                
-                conn.close()
-                print(f"Parqueo {PARQUEO_ID} - Cliente remoto desconectado")
+                    buf += data
+                    while b"\n" in buf:
+                        linea, buf = buf.split(b"\n", 1)
+                        comando = linea.strip()
+                        if comando:
+                            respuesta = self.procesar_comando_remoto(comando)
+                            conn.sendall(respuesta)  # Un solo envío; cada respuesta termina en \n
+                    
+                    if len(buf) > TAM_MAX_COMANDO:
+                        buf = b""  # Basura sin fin de línea
                 
             except Exception as e:
                 print(f"Parqueo {PARQUEO_ID} - Error en servidor remoto: {e}")
                 time.sleep(1)
+            finally:
+                # Cerrar siempre, también si hubo error, para no perder sockets
+                if conn is not None:
+                    conn.close()
+                    log(f"Parqueo {PARQUEO_ID} - Cliente remoto desconectado")
     
     def ejecutar(self):
         """Ejecutar el sistema completo"""
@@ -10,21 +10,32 @@ Componentes del sistema:
 - Comunicación WiFi: Control remoto desde GUI
 """
 
-from machine import Pin, PWM, ADC
+from machine import Pin, PWM, ADC, Timer, mem32
+import micropython
+from micropython import const
+import sys
 import time
-import socket
-import network
-import json
-import _thread
+import array
+try:
+    from collections import OrderedDict
+except ImportError:
+    from ucollections import OrderedDict  # Firmwares de MicroPython antiguos
+try:
+    import asyncio
+except ImportError:
+    import uasyncio as asyncio  # Firmwares de MicroPython anteriores a 1.20
 
 # ========== CONFIGURACIÓN DE RED ==========
 SSID = "Admiti q sos pobre"
 PASSWORD = "soy pobre"
-PUERTO_SERVIDOR = 1718
+PUERTO_SERVIDOR = const(1718)
+INACTIVIDAD_CLIENTE_S = const(60)  # Se cierra un cliente que no envía comandos en este tiempo
 
 # ========== CONFIGURACIÓN DE PINES ==========
 # Servomotor (barrera)
-SERVO_PIN = 26 #adc0
+SERVO_PIN = const(26) #adc0
+TIEMPO_PASO_MS = const(5000)  # Tiempo que la barrera queda abierta para que pase el vehículo
+TIEMPO_PASO_REMOTO_MS = const(3000)  # Ídem para el comando remoto ABRIR_PASO
 
 # Display 7 segmentos (ánodo común)
 DISPLAY_PINS = {
@@ -39,47 +50,131 @@ DISPLAY_PINS = {
 }
 
 # Botones
-BOTON_INGRESO = 17
-BOTON_PAGO = 14
+BOTON_INGRESO = const(17)
+BOTON_PAGO = const(14)
+ANTIRREBOTE_MS = const(500)  # Ignorar pulsaciones hasta 500 ms después de atender la anterior
+INTERVALO_BUCLE_MS = const(20)  # Espera del bucle principal entre revisiones de pulsaciones
 
 # LEDs indicadores de espacios
-LED_ESPACIO_1 = 15
-LED_ESPACIO_2 = 16
+LED_ESPACIO_1 = const(15)
+LED_ESPACIO_2 = const(16)
 
 # Fotoresistencias (ADC)
-FOTO_ESPACIO_1 = 28  # ADC0
-FOTO_ESPACIO_2 = 27 # ADC1
+FOTO_ESPACIO_1 = const(28)  # ADC0
+FOTO_ESPACIO_2 = const(27) # ADC1
+MUESTRAS_FILTRO = const(5)  # Mediana de las últimas 5 lecturas de cada fotoresistencia
+INTERVALO_LEDS_MS = const(200)  # Periodo del temporizador que muestrea las fotoresistencias y actualiza los LEDs
 
 # ========== CONFIGURACIÓN DE TARIFAS ==========
-TARIFA_POR_10_SEGUNDOS = 1000  # Colones
-UMBRAL_FOTORESISTENCIA = 40000  # Valor para detectar ocupación (valores MAYORES = libre con luz)
+TARIFA_POR_10_SEGUNDOS = const(1000)  # Colones
+UMBRAL_FOTORESISTENCIA = const(40000)  # Valor para detectar ocupación (valores MAYORES = libre con luz)
+
+# ========== RESPUESTAS REMOTAS ==========
+# Respuestas fijas ya codificadas y terminadas en \n, listas para enviar
+RESP_SUBIR = b"Barrera abierta remotamente\n"
+RESP_BAJAR = b"Barrera cerrada remotamente\n"
+RESP_PASO = b"Secuencia de paso iniciada\n"
+RESP_INGRESO_OK = b"Ingreso remoto procesado exitosamente\n"
+RESP_INGRESO_DENEGADO = b"Ingreso remoto denegado - Sin espacios disponibles\n"
+RESP_PAGO_OK = b"Pago remoto procesado exitosamente\n"
+RESP_PAGO_SIN_VEHICULOS = "No hay vehículos para procesar pago\n".encode('utf-8')
+RESP_DESCONOCIDO = b"Comando no reconocido: "  # + comando + \n
+
+# Plantilla JSON de la respuesta a ESTADO (se llena con %, sin armar un dict)
+ESTADO_FMT = ('{"espacios_disponibles":%d,"vehiculos_activos":%d,"espacio1_ocupado":%s,'
+              '"espacio2_ocupado":%s,"barrera_abierta":%s,"modo_pago":%s}\n')
+
+# Texto del menú de pruebas, armado una sola vez
+MENU_PRUEBAS = (
+    "\n" + "=" * 40 + "\n"
+    "    MENÚ DE PRUEBAS - PARQUEO INTELIGENTE\n" +
+    "=" * 40 + "\n"
+    "1. Probar Display 7 Segmentos (NO DISPONIBLE)\n"
+    "2. Probar LEDs\n"
+    "3. Probar Servomotor (Barrera)\n"
+    "4. Probar Fotoresistencias\n"
+    "5. Probar Botones\n"
+    "6. Mostrar Estado de Componentes\n"
+    "7. Ejecutar TODAS las pruebas disponibles\n"
+    "8. Iniciar sistema normal\n"
+    "9. Salir\n" +
+    "=" * 40 + "\n"
+)
 
 # ========== PATRONES PARA DISPLAY 7 SEGMENTOS ==========
-# Patrones para números 0-9 (ánodo común - 0=encendido, 1=apagado)
-DIGITOS_7SEG = {
-    0: {'a': 0, 'b': 0, 'c': 0, 'd': 0, 'e': 0, 'f': 0, 'g': 1},  # 0
-    1: {'a': 1, 'b': 0, 'c': 0, 'd': 1, 'e': 1, 'f': 1, 'g': 1},  # 1
-    2: {'a': 0, 'b': 0, 'c': 1, 'd': 0, 'e': 0, 'f': 1, 'g': 0},  # 2
-    3: {'a': 0, 'b': 0, 'c': 0, 'd': 0, 'e': 1, 'f': 1, 'g': 0},  # 3
-    4: {'a': 1, 'b': 0, 'c': 0, 'd': 1, 'e': 1, 'f': 0, 'g': 0},  # 4
-    5: {'a': 0, 'b': 1, 'c': 0, 'd': 0, 'e': 1, 'f': 0, 'g': 0},  # 5
-    6: {'a': 0, 'b': 1, 'c': 0, 'd': 0, 'e': 0, 'f': 0, 'g': 0},  # 6
-    7: {'a': 0, 'b': 0, 'c': 0, 'd': 1, 'e': 1, 'f': 1, 'g': 1},  # 7
-    8: {'a': 0, 'b': 0, 'c': 0, 'd': 0, 'e': 0, 'f': 0, 'g': 0},  # 8
-    9: {'a': 0, 'b': 0, 'c': 0, 'd': 0, 'e': 1, 'f': 0, 'g': 0}   # 9
-}
+# Segmentos encendidos para números 0-9, un bit por segmento (bit 0 = a ... bit 6 = g)
+DIGITOS_7SEG = bytes((
+    0b0111111,  # 0
+    0b0000110,  # 1
+    0b1011011,  # 2
+    0b1001111,  # 3
+    0b1100110,  # 4
+    0b1101101,  # 5
+    0b1111101,  # 6
+    0b0000111,  # 7
+    0b1111111,  # 8
+    0b1101111   # 9
+))
+
+# Registros SIO del RP2040 para escribir varios pines GPIO en una sola operación
+SIO_GPIO_OUT_SET = 0xd0000014
+SIO_GPIO_OUT_CLR = 0xd0000018
+
+# Bits GPIO de los segmentos a-g (el punto decimal no se toca)
+MASCARA_SEGMENTOS = 0
+for _seg in 'abcdefg':
+    MASCARA_SEGMENTOS |= 1 << DISPLAY_PINS[_seg]
+
+# Bits GPIO que quedan en 0 (encendidos, ánodo común) y en 1 (apagados) para cada dígito
+MASCARAS_ENCENDIDOS = []
+for _bits in DIGITOS_7SEG:
+    _mascara = 0
+    for _i, _seg in enumerate('abcdefg'):
+        if _bits >> _i & 1:
+            _mascara |= 1 << DISPLAY_PINS[_seg]
+    MASCARAS_ENCENDIDOS.append(_mascara)
+MASCARAS_ENCENDIDOS = tuple(MASCARAS_ENCENDIDOS)
+MASCARAS_DIGITOS = tuple(MASCARA_SEGMENTOS & ~_m for _m in MASCARAS_ENCENDIDOS)
+
+# Bits GPIO de los LEDs de espacio y LEDs encendidos (libres) para cada estado de
+# ocupación, indexado por ocupado1 | (ocupado2 << 1)
+MASCARA_LEDS = (1 << LED_ESPACIO_1) | (1 << LED_ESPACIO_2)
+MASCARAS_LEDS = (
+    MASCARA_LEDS,           # Ambos libres
+    1 << LED_ESPACIO_2,     # Espacio 1 ocupado
+    1 << LED_ESPACIO_1,     # Espacio 2 ocupado
+    0                       # Ambos ocupados
+)
 
 class ParqueoInteligente:
     """Clase principal para manejar el parqueo inteligente"""
     
+    # Atributos de instancia (en CPython fija el layout; MicroPython lo acepta pero lo ignora)
+    __slots__ = (
+        # Hardware
+        'servo', 'display_pins', 'boton_ingreso', 'boton_pago',
+        'led_espacio1', 'led_espacio2', 'foto_espacio1', 'foto_espacio2',
+        # Estado del parqueo
+        'espacios_disponibles', 'vehiculos_activos', 'id_vehiculo_actual',
+        'modo_pago', 'vehiculo_pagando', 'barrera_abierta', '_cierre_barrera',
+        # Botones (interrupciones)
+        '_pulso_ingreso', '_pulso_pago', '_ultima_atencion',
+        # Fotoresistencias y LEDs
+        '_muestras1', '_muestras2', '_indice_muestra', '_estado_leds',
+        '_actualizando_leds', '_timer_leds',
+    )
+    
     def __init__(self):
         self.inicializar_hardware()
         self.espacios_disponibles = 2
-        self.vehiculos_activos = {}  # ID_temp -> tiempo_entrada
+        # ID_temp -> tiempo_entrada (ticks_ms), en orden de llegada (el dict de MicroPython no
+        # conserva el orden de inserción)
+        self.vehiculos_activos = OrderedDict()
         self.id_vehiculo_actual = 1
         self.modo_pago = False
         self.vehiculo_pagando = None
         self.barrera_abierta = False
+        self._cierre_barrera = None  # ticks_ms en que se debe cerrar la barrera, si hay cierre pendiente
         
     def inicializar_hardware(self):
         """Inicializar todos los componentes de hardware"""
@@ -100,6 +195,14 @@ class ParqueoInteligente:
         self.boton_ingreso = Pin(BOTON_INGRESO, Pin.IN, Pin.PULL_UP)
         self.boton_pago = Pin(BOTON_PAGO, Pin.IN, Pin.PULL_UP)
         
+        # Interrupción por flanco descendente (presión): la ISR solo marca la pulsación
+        # y el bucle principal la atiende
+        self._pulso_ingreso = False
+        self._pulso_pago = False
+        self._ultima_atencion = time.ticks_ms()
+        self.boton_ingreso.irq(trigger=Pin.IRQ_FALLING, handler=self._isr_ingreso, hard=True)
+        self.boton_pago.irq(trigger=Pin.IRQ_FALLING, handler=self._isr_pago, hard=True)
+        
         # LEDs
         self.led_espacio1 = Pin(LED_ESPACIO_1, Pin.OUT)
         self.led_espacio2 = Pin(LED_ESPACIO_2, Pin.OUT)
@@ -108,28 +211,35 @@ class ParqueoInteligente:
         self.foto_espacio1 = ADC(Pin(FOTO_ESPACIO_1))
         self.foto_espacio2 = ADC(Pin(FOTO_ESPACIO_2))
         
+        # Últimas lecturas de cada fotoresistencia para el filtro de mediana
+        self._muestras1 = array.array('H', [self.foto_espacio1.read_u16()] * MUESTRAS_FILTRO)
+        self._muestras2 = array.array('H', [self.foto_espacio2.read_u16()] * MUESTRAS_FILTRO)
+        self._indice_muestra = 0
+        self._estado_leds = -1  # Último estado escrito en los LEDs (ninguno aún)
+        self._actualizando_leds = False  # Evita que el temporizador interrumpa una actualización en curso
+        self._timer_leds = None
+        
         # Estado inicial
         self.actualizar_leds()
         self.mostrar_espacios_disponibles()
         
         print("Hardware inicializado correctamente")
     
+    @micropython.native
     def mostrar_en_display(self, numero):
         """Mostrar número en display 7 segmentos (0-9)"""
         if numero < 0 or numero > 9:
             numero = 0
             
-        patron = DIGITOS_7SEG[numero]
-        
-        for segmento in ['a', 'b', 'c', 'd', 'e', 'f', 'g']:
-            self.display_pins[segmento].value(patron[segmento])
+        mem32[SIO_GPIO_OUT_SET] = MASCARAS_DIGITOS[numero]  # Segmentos apagados
+        mem32[SIO_GPIO_OUT_CLR] = MASCARAS_ENCENDIDOS[numero]  # Segmentos encendidos
     
     def mostrar_espacios_disponibles(self):
         """Mostrar espacios disponibles (solo en consola, display no disponible)"""
         # self.mostrar_en_display(self.espacios_disponibles)  # Display deshabilitado
         print(f"Espacios disponibles: {self.espacios_disponibles}/2 (Display 7-seg no disponible)")
     
-    def probar_display_7_segmentos(self):
+    async def probar_display_7_segmentos(self):
         """Probar el display 7 segmentos mostrando números del 0 al 9"""
         print("\n=== PRUEBA DISPLAY 7 SEGMENTOS ===")
         print("Mostrando números del 0 al 9...")
@@ -137,16 +247,25 @@ class ParqueoInteligente:
         for numero in range(10):
             print(f"Mostrando número: {numero}")
             self.mostrar_en_display(numero)
-            time.sleep(1)
+            await asyncio.sleep_ms(1000)
         
         # Volver al estado normal
         self.mostrar_espacios_disponibles()
         print("Prueba de display completada\n")
     
+    @micropython.native
+    def muestrear_fotoresistencias(self):
+        """Guardar una lectura nueva de cada fotoresistencia en el filtro"""
+        i = self._indice_muestra
+        self._muestras1[i] = self.foto_espacio1.read_u16()
+        self._muestras2[i] = self.foto_espacio2.read_u16()
+        self._indice_muestra = (i + 1) % MUESTRAS_FILTRO
+    
+    @micropython.native
     def leer_fotoresistencias(self):
-        """Leer estado de las fotoresistencias"""
-        valor1 = self.foto_espacio1.read_u16()
-        valor2 = self.foto_espacio2.read_u16()
+        """Leer estado de las fotoresistencias (mediana de las últimas muestras)"""
+        valor1 = sorted(self._muestras1)[MUESTRAS_FILTRO // 2]
+        valor2 = sorted(self._muestras2)[MUESTRAS_FILTRO // 2]
         
         # True = ocupado, False = libre
         # Más luz (valores altos) = LIBRE, menos luz (valores bajos) = OCUPADO
@@ -155,7 +274,7 @@ class ParqueoInteligente:
         
         return ocupado1, ocupado2
     
-    def probar_fotoresistencias(self):
+    async def probar_fotoresistencias(self):
         """Probar las fotoresistencias y mostrar valores"""
         print("\n=== PRUEBA FOTORESISTENCIAS ===")
         print("Leyendo valores de fotoresistencias por 10 segundos...")
@@ -172,23 +291,41 @@ class ParqueoInteligente:
             estado2 = "OCUPADO" if valor2 < UMBRAL_FOTORESISTENCIA else "LIBRE"
             
             print(f"Lectura {i+1}: Espacio1={valor1} ({estado1}) | Espacio2={valor2} ({estado2})")
-            time.sleep(1)
+            await asyncio.sleep_ms(1000)
         
         print("Prueba de fotoresistencias completada\n")
     
+    @micropython.native
     def actualizar_leds(self):
         """Actualizar LEDs según disponibilidad de espacios"""
-        ocupado1, ocupado2 = self.leer_fotoresistencias()
-        
-        # LED encendido = espacio libre, LED apagado = espacio ocupado
-        self.led_espacio1.value(0 if ocupado1 else 1)
-        self.led_espacio2.value(0 if ocupado2 else 1)
-        
-        # Actualizar contador de espacios
-        espacios_ocupados = sum([ocupado1, ocupado2])
-        self.espacios_disponibles = 2 - espacios_ocupados
+        # El temporizador puede dispararse en medio de una llamada directa (lecturas ADC a medias)
+        if self._actualizando_leds:
+            return
+        self._actualizando_leds = True
+        try:
+            self.muestrear_fotoresistencias()
+            ocupado1, ocupado2 = self.leer_fotoresistencias()
+            
+            # LED encendido = espacio libre, LED apagado = espacio ocupado; ambos LEDs
+            # se escriben juntos en los registros SIO y solo cuando el estado cambia
+            estado = int(ocupado1) | (int(ocupado2) << 1)
+            if estado != self._estado_leds:
+                encendidos = MASCARAS_LEDS[estado]
+                mem32[SIO_GPIO_OUT_SET] = encendidos
+                mem32[SIO_GPIO_OUT_CLR] = MASCARA_LEDS & ~encendidos
+                self._estado_leds = estado
+            
+            # Actualizar contador de espacios
+            espacios_ocupados = int(ocupado1) + int(ocupado2)
+            self.espacios_disponibles = 2 - espacios_ocupados
+        finally:
+            self._actualizando_leds = False
+    
+    def _tick_leds(self, timer):
+        """Callback del temporizador de LEDs"""
+        self.actualizar_leds()
     
-    def probar_leds(self):
+    async def probar_leds(self):
         """Probar los LEDs de los espacios"""
         print("\n=== PRUEBA LEDS DE ESPACIOS ===")
         
@@ -196,27 +333,28 @@ class ParqueoInteligente:
         print("Encendiendo LED Espacio 1...")
         self.led_espacio1.value(1)
         self.led_espacio2.value(0)
-        time.sleep(2)
+        await asyncio.sleep_ms(2000)
         
         # Encender LED 2
         print("Encendiendo LED Espacio 2...")
         self.led_espacio1.value(0)
         self.led_espacio2.value(1)
-        time.sleep(2)
+        await asyncio.sleep_ms(2000)
         
         # Encender ambos
         print("Encendiendo ambos LEDs...")
         self.led_espacio1.value(1)
         self.led_espacio2.value(1)
-        time.sleep(2)
+        await asyncio.sleep_ms(2000)
         
         # Apagar ambos
         print("Apagando ambos LEDs...")
         self.led_espacio1.value(0)
         self.led_espacio2.value(0)
-        time.sleep(1)
+        await asyncio.sleep_ms(1000)
         
-        # Volver al estado normal
+        # Volver al estado normal (la prueba cambió los LEDs por fuera de actualizar_leds)
+        self._estado_leds = -1
         self.actualizar_leds()
         print("Prueba de LEDs completada\n")
     
@@ -231,34 +369,44 @@ class ParqueoInteligente:
         print("Cerrando barrera...")
         self.servo.duty_ns(1700000)  # Posición cerrada
         self.barrera_abierta = False
+        self._cierre_barrera = None
+    
+    def programar_cierre_barrera(self, ms=TIEMPO_PASO_MS):
+        """Cerrar la barrera dentro de ms milisegundos (lo hace el bucle de botones)"""
+        self._cierre_barrera = time.ticks_add(time.ticks_ms(), ms)
     
-    def probar_servomotor(self):
+    def revisar_cierre_barrera(self):
+        """Cerrar la barrera si ya venció el cierre programado"""
+        if self._cierre_barrera is not None and time.ticks_diff(time.ticks_ms(), self._cierre_barrera) >= 0:
+            self.cerrar_barrera()
+    
+    async def probar_servomotor(self):
         """Probar el movimiento del servomotor (barrera)"""
         print("\n=== PRUEBA SERVOMOTOR (BARRERA) ===")
         
         # Estado inicial (cerrada)
         print("Posición inicial: CERRADA")
         self.servo.duty_ns(1700000)
-        time.sleep(2)
+        await asyncio.sleep_ms(2000)
         
         # Abrir barrera
         print("Abriendo barrera...")
         self.servo.duty_ns(800000)
-        time.sleep(2)
+        await asyncio.sleep_ms(2000)
         
         # Posiciones intermedias
         print("Posición intermedia 1...")
         self.servo.duty_ns(1250000)
-        time.sleep(2)
+        await asyncio.sleep_ms(2000)
         
         print("Posición intermedia 2...")
         self.servo.duty_ns(1000000)
-        time.sleep(2)
+        await asyncio.sleep_ms(2000)
         
         # Volver a cerrar
         print("Cerrando barrera...")
         self.servo.duty_ns(1700000)
-        time.sleep(2)
+        await asyncio.sleep_ms(2000)
         
         self.barrera_abierta = False
         print("Prueba de servomotor completada\n")
@@ -269,17 +417,12 @@ class ParqueoInteligente:
             print(f"Vehículo {self.id_vehiculo_actual} solicitando ingreso...")
             
             # Registrar vehículo
-            self.vehiculos_activos[self.id_vehiculo_actual] = time.time()
+            self.vehiculos_activos[self.id_vehiculo_actual] = time.ticks_ms()
             
-            # Abrir barrera
+            # Abrir barrera y cerrarla cuando el vehículo haya pasado
             self.abrir_barrera()
             print(f"Ingreso autorizado para vehículo {self.id_vehiculo_actual}")
-            
-            # Esperar que el vehículo pase
-            time.sleep(5)
-            
-            # Cerrar barrera
-            self.cerrar_barrera()
+            self.programar_cierre_barrera()
             
             # Actualizar display
             self.actualizar_leds()
@@ -293,16 +436,16 @@ class ParqueoInteligente:
             print("PARQUEO LLENO - PARQUEO LLENO - PARQUEO LLENO")
             for _ in range(3):
                 print("*** ESPACIO NO DISPONIBLE ***")
-                time.sleep(0.5)
             self.mostrar_espacios_disponibles()
             return False
     
+    @micropython.native
     def calcular_costo(self, tiempo_entrada):
-        """Calcular costo de parqueo"""
-        tiempo_estancia = time.time() - tiempo_entrada
-        bloques_10_segundos = max(1, int(tiempo_estancia // 10) + (1 if tiempo_estancia % 10 > 0 else 0))
+        """Calcular costo de parqueo (tiempo_entrada en ticks_ms; estancia en segundos)"""
+        estancia_ms = time.ticks_diff(time.ticks_ms(), tiempo_entrada)
+        bloques_10_segundos = max(1, (estancia_ms + 9999) // 10000)  # Redondeo hacia arriba
         costo = bloques_10_segundos * TARIFA_POR_10_SEGUNDOS
-        return costo, tiempo_estancia
+        return costo, estancia_ms // 1000
     
     def procesar_pago(self):
         """Procesar solicitud de pago/salida"""
@@ -315,16 +458,16 @@ class ParqueoInteligente:
             self.modo_pago = True
             
             # Tomar el primer vehículo (FIFO)
-            vehiculo_id = min(self.vehiculos_activos.keys())
+            vehiculo_id = next(iter(self.vehiculos_activos))
             self.vehiculo_pagando = vehiculo_id
             tiempo_entrada = self.vehiculos_activos[vehiculo_id]
             
             costo, tiempo_estancia = self.calcular_costo(tiempo_entrada)
-            print(f"Vehículo {vehiculo_id} - Tiempo: {tiempo_estancia:.0f}s - Costo: ₡{costo}")
+            print(f"Vehículo {vehiculo_id} - Tiempo: {tiempo_estancia}s - Costo: ₡{costo}")
             
             # Mostrar costo (display no disponible - solo consola)
             print(f"*** COSTO A PAGAR: ₡{costo} ***")
-            print(f"*** TIEMPO: {tiempo_estancia:.0f} segundos ***")
+            print(f"*** TIEMPO: {tiempo_estancia} segundos ***")
             
             print(f"Presione nuevamente el botón de pago para completar la salida")
             return True
@@ -341,11 +484,8 @@ class ParqueoInteligente:
             
             print(f"Salida autorizada para vehículo {self.vehiculo_pagando}")
             
-            # Esperar que el vehículo salga
-            time.sleep(5)
-            
-            # Cerrar barrera
-            self.cerrar_barrera()
+            # Cerrar barrera cuando el vehículo haya salido
+            self.programar_cierre_barrera()
             
             # Resetear modo pago
             self.modo_pago = False
@@ -357,37 +497,55 @@ class ParqueoInteligente:
             
             return True
     
-    def monitorear_botones(self):
-        """Monitorear presión de botones"""
-        estado_anterior_ingreso = 1
-        estado_anterior_pago = 1
+    def _isr_ingreso(self, pin):
+        """Interrupción del botón de ingreso"""
+        self._pulso_ingreso = True
+    
+    def _isr_pago(self, pin):
+        """Interrupción del botón de pago"""
+        self._pulso_pago = True
+    
+    def _antirrebote_cumplido(self):
+        """Indicar si ya pasó el tiempo de antirrebote desde la última pulsación atendida"""
+        return time.ticks_diff(time.ticks_ms(), self._ultima_atencion) >= ANTIRREBOTE_MS
+    
+    async def monitorear_botones(self):
+        """Atender las pulsaciones marcadas por las interrupciones de los botones"""
+        # Los LEDs se actualizan por temporizador, independiente de este bucle
+        self._timer_leds = Timer(period=INTERVALO_LEDS_MS, mode=Timer.PERIODIC,
+                                 callback=self._tick_leds)
         
-        while True:
-            # Leer estado actual de botones
-            estado_ingreso = self.boton_ingreso.value()
-            estado_pago = self.boton_pago.value()
-            
-            # Detectar presión del botón de ingreso (flanco descendente)
-            if estado_anterior_ingreso == 1 and estado_ingreso == 0:
-                print("Botón de INGRESO presionado")
-                self.procesar_ingreso()
-                time.sleep(0.5)  # Debounce
-            
-            # Detectar presión del botón de pago (flanco descendente)
-            if estado_anterior_pago == 1 and estado_pago == 0:
-                print("Botón de PAGO presionado")
-                self.procesar_pago()
-                time.sleep(0.5)  # Debounce
-            
-            estado_anterior_ingreso = estado_ingreso
-            estado_anterior_pago = estado_pago
-            
-            # Actualizar LEDs periódicamente
-            self.actualizar_leds()
-            
-            time.sleep(0.1)
+        # Métodos resueltos una sola vez; dentro del bucle se leen como variables locales
+        ticks_ms = time.ticks_ms
+        revisar_cierre_barrera = self.revisar_cierre_barrera
+        dormir = asyncio.sleep_ms
+        
+        try:
+            while True:
+                if self._pulso_ingreso:
+                    if self._antirrebote_cumplido():
+                        print("Botón de INGRESO presionado")
+                        self.procesar_ingreso()
+                        self._ultima_atencion = ticks_ms()
+                    self._pulso_ingreso = False  # También descarta los rebotes
+                
+                if self._pulso_pago:
+                    if self._antirrebote_cumplido():
+                        print("Botón de PAGO presionado")
+                        self.procesar_pago()
+                        self._ultima_atencion = ticks_ms()
+                    self._pulso_pago = False
+                
+                # Cerrar la barrera si corresponde
+                revisar_cierre_barrera()
+                
+                # Ceder el control al servidor remoto hasta la próxima revisión
+                await dormir(INTERVALO_BUCLE_MS)
+        finally:
+            self._timer_leds.deinit()
+            self._timer_leds = None
     
-    def probar_botones(self):
+    async def probar_botones(self):
         """Probar los botones de ingreso y pago"""
         print("\n=== PRUEBA BOTONES ===")
         print("Presiona los botones para probarlos (10 segundos)...")
@@ -395,13 +553,20 @@ class ParqueoInteligente:
         print("Botón PAGO: Pin 11")
         print("(Los botones usan pull-up, presionar = 0, suelto = 1)\n")
         
-        tiempo_inicial = time.time()
+        # Métodos resueltos una sola vez; dentro del bucle se leen como variables locales
+        ticks_ms = time.ticks_ms
+        ticks_diff = time.ticks_diff
+        leer_ingreso = self.boton_ingreso.value
+        leer_pago = self.boton_pago.value
+        dormir = asyncio.sleep_ms
+        
+        tiempo_inicial = ticks_ms()
         estado_anterior_ingreso = 1
         estado_anterior_pago = 1
         
-        while time.time() - tiempo_inicial < 10:
-            estado_ingreso = self.boton_ingreso.value()
-            estado_pago = self.boton_pago.value()
+        while ticks_diff(ticks_ms(), tiempo_inicial) < 10000:
+            estado_ingreso = leer_ingreso()
+            estado_pago = leer_pago()
             
             # Detectar presión del botón de ingreso
             if estado_anterior_ingreso == 1 and estado_ingreso == 0:
@@ -417,52 +582,51 @@ class ParqueoInteligente:
             
             estado_anterior_ingreso = estado_ingreso
             estado_anterior_pago = estado_pago
-            time.sleep(0.1)
+            await dormir(100)
         
         print("Prueba de botones completada\n")
     
     def mostrar_estado_componentes(self):
         """Mostrar estado actual de todos los componentes"""
-        print("\n=== ESTADO ACTUAL DE COMPONENTES ===")
-        
-        # Display 7 segmentos
-        print("Display 7 Segmentos: NO DISPONIBLE (Hardware no conectado)")
-        
         # Estado de fotoresistencias
         valor1 = self.foto_espacio1.read_u16()
         valor2 = self.foto_espacio2.read_u16()
         estado1 = "OCUPADO" if valor1 < UMBRAL_FOTORESISTENCIA else "LIBRE"
         estado2 = "OCUPADO" if valor2 < UMBRAL_FOTORESISTENCIA else "LIBRE"
         
-        print(f"Fotoresistencias:")
-        print(f"  Espacio 1: {valor1} ({estado1})")
-        print(f"  Espacio 2: {valor2} ({estado2})")
-        
         # Estado de LEDs
         led1_estado = "ENCENDIDO" if self.led_espacio1.value() else "APAGADO"
         led2_estado = "ENCENDIDO" if self.led_espacio2.value() else "APAGADO"
-        print(f"LEDs:")
-        print(f"  LED Espacio 1: {led1_estado}")
-        print(f"  LED Espacio 2: {led2_estado}")
         
         # Estado de botones
         boton_ing = "PRESIONADO" if not self.boton_ingreso.value() else "LIBRE"
         boton_pago = "PRESIONADO" if not self.boton_pago.value() else "LIBRE"
-        print(f"Botones:")
-        print(f"  Botón Ingreso: {boton_ing}")
-        print(f"  Botón Pago: {boton_pago}")
         
-        # Estado general
-        print(f"Sistema:")
-        print(f"  Espacios disponibles: {self.espacios_disponibles}/2")
-        print(f"  Barrera: {'ABIERTA' if self.barrera_abierta else 'CERRADA'}")
-        print(f"  Vehículos activos: {len(self.vehiculos_activos)}")
-        print(f"  Próximo ID vehículo: {self.id_vehiculo_actual}")
-        
-        print("================================\n")
+        # Todo el reporte se arma primero y se escribe en la consola de una sola vez
+        sys.stdout.write(
+            "\n=== ESTADO ACTUAL DE COMPONENTES ===\n"
+            "Display 7 Segmentos: NO DISPONIBLE (Hardware no conectado)\n"
+            "Fotoresistencias:\n"
+            f"  Espacio 1: {valor1} ({estado1})\n"
+            f"  Espacio 2: {valor2} ({estado2})\n"
+            "LEDs:\n"
+            f"  LED Espacio 1: {led1_estado}\n"
+            f"  LED Espacio 2: {led2_estado}\n"
+            "Botones:\n"
+            f"  Botón Ingreso: {boton_ing}\n"
+            f"  Botón Pago: {boton_pago}\n"
+            "Sistema:\n"
+            f"  Espacios disponibles: {self.espacios_disponibles}/2\n"
+            f"  Barrera: {'ABIERTA' if self.barrera_abierta else 'CERRADA'}\n"
+            f"  Vehículos activos: {len(self.vehiculos_activos)}\n"
+            f"  Próximo ID vehículo: {self.id_vehiculo_actual}\n"
+            "================================\n\n"
+        )
     
-    def conectar_wifi(self):
-        """Conectar a WiFi"""
+    async def conectar_wifi(self):
+        """Conectar a WiFi (sin detener la atención de los botones)"""
+        import network  # Solo se carga en modo normal; el modo pruebas no usa WiFi
+        
         wlan = network.WLAN(network.STA_IF)
         wlan.active(True)
         
@@ -474,7 +638,7 @@ class ParqueoInteligente:
                 if wlan.isconnected():
                     break
                 print(".", end="")
-                time.sleep(0.5)
+                await asyncio.sleep_ms(500)
             
             if wlan.isconnected():
                 ip = wlan.ifconfig()[0]
@@ -488,86 +652,110 @@ class ParqueoInteligente:
             print(f"Ya conectado a WiFi. IP: {ip}")
             return ip
     
-    def procesar_comando_remoto(self, comando):
-        """Procesar comandos desde la aplicación GUI remota"""
-        comando = comando.strip().upper()
-        print(f"Comando remoto recibido: {comando}")
-        
-        if comando == "SUBIR":
-            self.abrir_barrera()
-            return "Barrera abierta remotamente"
-            
-        elif comando == "BAJAR":
-            self.cerrar_barrera()
-            return "Barrera cerrada remotamente"
-            
-        elif comando == "ABRIR_PASO":
-            self.abrir_barrera()
-            time.sleep(3)
-            self.cerrar_barrera()
-            return "Secuencia de paso completada"
-            
-        elif comando == "ESTADO":
-            ocupado1, ocupado2 = self.leer_fotoresistencias()
-            estado = {
-                "espacios_disponibles": self.espacios_disponibles,
-                "vehiculos_activos": len(self.vehiculos_activos),
-                "espacio1_ocupado": ocupado1,
-                "espacio2_ocupado": ocupado2,
-                "barrera_abierta": self.barrera_abierta,
-                "modo_pago": self.modo_pago
-            }
-            return json.dumps(estado)
-            
-        elif comando == "INGRESO_REMOTO":
-            if self.procesar_ingreso():
-                return "Ingreso remoto procesado exitosamente"
-            else:
-                return "Ingreso remoto denegado - Sin espacios disponibles"
-                
-        elif comando == "PAGO_REMOTO":
-            if self.procesar_pago():
-                return "Pago remoto procesado exitosamente"
-            else:
-                return "No hay vehículos para procesar pago"
-                
+    def _cmd_subir(self):
+        self.abrir_barrera()
+        self._cierre_barrera = None  # Queda abierta hasta un BAJAR
+        return RESP_SUBIR
+    
+    def _cmd_bajar(self):
+        self.cerrar_barrera()
+        return RESP_BAJAR
+    
+    def _cmd_abrir_paso(self):
+        self.abrir_barrera()
+        self.programar_cierre_barrera(TIEMPO_PASO_REMOTO_MS)
+        return RESP_PASO
+    
+    def _cmd_estado(self):
+        ocupado1, ocupado2 = self.leer_fotoresistencias()
+        estado = ESTADO_FMT % (
+            self.espacios_disponibles,
+            len(self.vehiculos_activos),
+            "true" if ocupado1 else "false",
+            "true" if ocupado2 else "false",
+            "true" if self.barrera_abierta else "false",
+            "true" if self.modo_pago else "false"
+        )
+        return estado.encode('utf-8')
+    
+    def _cmd_ingreso_remoto(self):
+        if self.procesar_ingreso():
+            return RESP_INGRESO_OK
+        else:
+            return RESP_INGRESO_DENEGADO
+    
+    def _cmd_pago_remoto(self):
+        if self.procesar_pago():
+            return RESP_PAGO_OK
         else:
-            return f"Comando no reconocido: {comando}"
+            return RESP_PAGO_SIN_VEHICULOS
+    
+    # Comando remoto (bytes) -> método que lo atiende
+    _COMANDOS = {
+        b"SUBIR": _cmd_subir,
+        b"BAJAR": _cmd_bajar,
+        b"ABRIR_PASO": _cmd_abrir_paso,
+        b"ESTADO": _cmd_estado,
+        b"INGRESO_REMOTO": _cmd_ingreso_remoto,
+        b"PAGO_REMOTO": _cmd_pago_remoto,
+    }
+    
+    def procesar_comando_remoto(self, comando):
+        """Procesar un comando (bytes) desde la aplicación GUI remota y devolver la respuesta en bytes"""
+        comando = comando.strip()
+        manejador = self._COMANDOS.get(comando)
+        if manejador is None:
+            comando = comando.upper()  # Los comandos en minúsculas también se aceptan
+            manejador = self._COMANDOS.get(comando)
+        
+        print("Comando remoto recibido:", comando)
+        
+        if manejador is None:
+            return RESP_DESCONOCIDO + comando + b"\n"
+        return manejador(self)
     
-    def servidor_remoto(self):
+    async def servidor_remoto(self):
         """Servidor para comunicación remota con GUI"""
-        ip = self.conectar_wifi()
+        ip = await self.conectar_wifi()
         if not ip:
             print("No se pudo establecer conexión WiFi para servidor remoto")
             return
         
-        s = socket.socket()
-        s.bind(('', PUERTO_SERVIDOR))
-        s.listen(1)
+        await asyncio.start_server(self._atender_cliente, '0.0.0.0', PUERTO_SERVIDOR)
         print(f"Servidor remoto iniciado en {ip}:{PUERTO_SERVIDOR}")
-        
-        while True:
-            try:
-                conn, addr = s.accept()
-                print(f"Cliente remoto conectado desde: {addr}")
-                
-                while True:
-                    data = conn.recv(1024)
-                    if not data:
-                        break
-                    
-                    comando = data.decode('utf-8').strip()
-                    respuesta = self.procesar_comando_remoto(comando)
-                    conn.send(respuesta.encode('utf-8'))
-                
-                conn.close()
-                print("Cliente remoto desconectado")
+    
+    async def _atender_cliente(self, reader, writer):
+        """Atender los comandos de un cliente remoto, una línea por comando"""
+        print(f"Cliente remoto conectado desde: {writer.get_extra_info('peername')}")
+        try:
+            while True:
+                try:
+                    linea = await asyncio.wait_for(reader.readline(), INACTIVIDAD_CLIENTE_S)
+                except asyncio.TimeoutError:
+                    print("Cliente remoto inactivo, cerrando conexión")
+                    break
+                if not linea:
+                    break
                 
-            except Exception as e:
-                print(f"Error en servidor remoto: {e}")
-                time.sleep(1)
+                comando = linea.strip()
+                if not comando:
+                    continue
+                respuesta = self.procesar_comando_remoto(comando)
+                writer.write(respuesta)  # Ya codificada; cada respuesta termina en \n
+                await writer.drain()
+        except Exception as e:
+            print(f"Error en servidor remoto: {e}")
+        finally:
+            writer.close()
+            await writer.wait_closed()
+            print("Cliente remoto desconectado")
+    
+    async def _principal(self):
+        """Correr el servidor remoto y el monitoreo de botones en el mismo planificador"""
+        asyncio.create_task(self.servidor_remoto())
+        await self.monitorear_botones()
     
-    def ejecutar_pruebas_componentes(self):
+    async def ejecutar_pruebas_componentes(self):
         """Ejecutar todas las pruebas de componentes"""
         print("\n" + "=" * 50)
         print("    SISTEMA DE PRUEBAS - PARQUEO INTELIGENTE")
@@ -577,19 +765,19 @@ class ParqueoInteligente:
         try:
             # Prueba 1: Display 7 segmentos (DESHABILITADO - Hardware no disponible)
             print("Saltando prueba de Display 7 segmentos - Hardware no disponible\n")
-            # self.probar_display_7_segmentos()
+            # await self.probar_display_7_segmentos()
             
             # Prueba 2: LEDs
-            self.probar_leds()
+            await self.probar_leds()
             
             # Prueba 3: Servomotor
-            self.probar_servomotor()
+            await self.probar_servomotor()
             
             # Prueba 4: Fotoresistencias
-            self.probar_fotoresistencias()
+            await self.probar_fotoresistencias()
             
             # Prueba 5: Botones
-            self.probar_botones()
+            await self.probar_botones()
             
             print("=" * 50)
             print("    TODAS LAS PRUEBAS COMPLETADAS")
@@ -601,27 +789,16 @@ class ParqueoInteligente:
     def mostrar_menu_pruebas(self):
         """Mostrar menú de opciones de prueba"""
         while True:
-            print("\n" + "=" * 40)
-            print("    MENÚ DE PRUEBAS - PARQUEO INTELIGENTE")
-            print("=" * 40)
-            print("1. Probar Display 7 Segmentos (NO DISPONIBLE)")
-            print("2. Probar LEDs")
-            print("3. Probar Servomotor (Barrera)")
-            print("4. Probar Fotoresistencias")
-            print("5. Probar Botones")
-            print("6. Mostrar Estado de Componentes")
-            print("7. Ejecutar TODAS las pruebas disponibles")
-            print("8. Iniciar sistema normal")
-            print("9. Salir")
-            print("=" * 40)
+            sys.stdout.write(MENU_PRUEBAS)
             
             try:
                 # En MicroPython, adaptar según tu método de entrada preferido
-                print("MÉTODO DE SELECCIÓN EN MICROPYTHON:")
-                print("- Modifica el código para usar botones físicos")
-                print("- O usa conexión serial/WiFi para comandos")
-                print("- O cambia la variable de selección directamente")
-                print()
+                sys.stdout.write(
+                    "MÉTODO DE SELECCIÓN EN MICROPYTHON:\n"
+                    "- Modifica el código para usar botones físicos\n"
+                    "- O usa conexión serial/WiFi para comandos\n"
+                    "- O cambia la variable de selección directamente\n\n"
+                )
                 
                 # Variable para seleccionar función (modificar según necesites)
                 SELECCION = 4  # Cambiar este valor para probar diferentes funciones
@@ -633,19 +810,19 @@ class ParqueoInteligente:
                 if SELECCION == 1:
                     print("Display 7 segmentos no disponible - Hardware no conectado")
                     print("Saltando a prueba de LEDs...\n")
-                    self.probar_leds()
+                    asyncio.run(self.probar_leds())
                 elif SELECCION == 2:
-                    self.probar_leds()
+                    asyncio.run(self.probar_leds())
                 elif SELECCION == 3:
-                    self.probar_servomotor()
+                    asyncio.run(self.probar_servomotor())
                 elif SELECCION == 4:
-                    self.probar_fotoresistencias()
+                    asyncio.run(self.probar_fotoresistencias())
                 elif SELECCION == 5:
-                    self.probar_botones()
+                    asyncio.run(self.probar_botones())
                 elif SELECCION == 6:
                     self.mostrar_estado_componentes()
                 elif SELECCION == 7:
-                    self.ejecutar_pruebas_componentes()
+                    asyncio.run(self.ejecutar_pruebas_componentes())
                 elif SELECCION == 8:
                     self.ejecutar_sistema_normal()
                     break
@@ -654,7 +831,7 @@ class ParqueoInteligente:
                     break
                 else:
                     print("Opción no válida. Ejecutando todas las pruebas por defecto...")
-                    self.ejecutar_pruebas_componentes()
+                    asyncio.run(self.ejecutar_pruebas_componentes())
                 
                 # Para continuar con más pruebas, cambiar esta línea:
                 break  # Cambiar por 'continue' si quieres repetir el menú
@@ -678,16 +855,9 @@ class ParqueoInteligente:
         print("- Servidor WiFi remoto")
         print("=" * 50)
         
-        # Iniciar servidor remoto en hilo separado
-        try:
-            _thread.start_new_thread(self.servidor_remoto, ())
-            print("Servidor remoto iniciado en hilo separado")
-        except Exception as e:
-            print(f"Error iniciando servidor remoto: {e}")
-        
-        # Bucle principal - monitoreo de botones
+        # Servidor remoto y monitoreo de botones como tareas cooperativas
         print("Sistema listo. Monitoreando botones...")
-        self.monitorear_botones()
+        asyncio.run(self._principal())
     
     def ejecutar(self):
         """Punto de entrada principal del sistema"""
@@ -715,16 +885,9 @@ class ParqueoInteligente:
         print(" WiFi - Control remoto")
         print("=" * 40)
         
-        # Iniciar servidor remoto en hilo separado
-        try:
-            _thread.start_new_thread(self.servidor_remoto, ())
-            print("Servidor remoto iniciado en hilo separado")
-        except Exception as e:
-            print(f"Error iniciando servidor remoto: {e}")
-        
-        # Bucle principal - monitoreo de botones
+        # Servidor remoto y monitoreo de botones como tareas cooperativas
         print("Sistema listo. Monitoreando botones...")
-        self.monitorear_botones()
+        asyncio.run(self._principal())
 
 # ========== FUNCIÓN PRINCIPAL ==========
 def main():
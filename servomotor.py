@@ -1,11 +1,34 @@
 from machine import Pin, PWM
+import micropython
+from micropython import const
 import time
 import socket
 import network
+try:
+    import asyncio
+except ImportError:
+    import uasyncio as asyncio  # Firmwares de MicroPython anteriores a 1.20
 
 SSDI = "Admiti q sos pobre"
 PASSWORD = "soy pobre"
+ESPERA_WIFI_MS = const(10000)  # Tiempo máximo para obtener conexión WiFi
  
+# Respuestas ya codificadas y terminadas en \n, listas para enviar
+RESP_SUBIR = b"Barrera subiendo - Carro puede pasar.\n"
+RESP_BAJAR = b"Barrera bajando - Paso bloqueado.\n"
+RESP_PASO = b"Secuencia de paso iniciada.\n"
+RESP_DESCONOCIDO = b"Comando no reconocido. Usar: SUBIR, BAJAR, o ABRIR_PASO\n"
+
+# Códigos que devuelve _dispatch para cada comando
+CMD_DESCONOCIDO = const(0)
+CMD_SUBIR = const(1)
+CMD_BAJAR = const(2)
+CMD_ABRIR_PASO = const(3)
+
+# Posiciones del servomotor (ancho de pulso en ns) y tiempo de paso de ABRIR_PASO
+DUTY_OPEN = const(800000)  # Barrera abierta
+DUTY_CLOSED = const(1700000)  # Barrera cerrada
+DWELL_MS = const(3000)  # Tiempo que la barrera queda abierta para que pase el carro
 
 servoprofe = PWM(Pin(28))
 servoprofe.freq(50)
@@ -13,9 +36,11 @@ v_grados = 45
 v_repetir = 2
 
 # Inicializar servomotor en posición cerrada (barrera abajo)
-servoprofe.duty_ns(1700000)  # Posición inicial: barrera cerrada
+servoprofe.duty_ns(DUTY_CLOSED)  # Posición inicial: barrera cerrada
+barrier_close_deadline = None  # ticks_ms en que se debe cerrar la barrera, si hay cierre pendiente
+barrier_event = asyncio.Event()  # Avisa a barrier_loop que cambió el cierre pendiente
 
-def connect_wifi():
+async def connect_wifi():
     wlan = network.WLAN(network.STA_IF)
     wlan.active(True)
     
@@ -23,71 +48,131 @@ def connect_wifi():
         print("Conectando a WiFi...")
         wlan.connect(SSDI, PASSWORD)
         
-        for i in range(20):
-            if wlan.isconnected():
+        # Revisar cada 50 ms para seguir apenas haya conexión, y abandonar enseguida
+        # si la clave es incorrecta o la red no aparece
+        limite = time.ticks_add(time.ticks_ms(), ESPERA_WIFI_MS)
+        while not wlan.isconnected() and time.ticks_diff(limite, time.ticks_ms()) > 0:
+            if wlan.status() in (network.STAT_WRONG_PASSWORD, network.STAT_NO_AP_FOUND,
+                                 network.STAT_CONNECT_FAIL):
                 break
-            print(".", end="")
-            time.sleep(0.5)
-        if wlan.isconnected():
-            ip = wlan.ifconfig()[0]
-            print("\nConectado a WiFi. IP:", ip)
-            return ip
+            await asyncio.sleep_ms(50)
+    
+    if wlan.isconnected():
+        ip = wlan.ifconfig()[0]
+        print("Conectado a WiFi. IP:", ip)
+        return ip
+    else:
+        print("No se pudo conectar a la red WiFi. Estado:", wlan.status())
+        return None
+
+def check_barrier():
+    """Cerrar la barrera si ya venció el tiempo de paso"""
+    global barrier_close_deadline
+    if barrier_close_deadline is not None and time.ticks_diff(time.ticks_ms(), barrier_close_deadline) >= 0:
+        servoprofe.duty_ns(DUTY_CLOSED)  # Cerrar barrera
+        barrier_close_deadline = None
+        print("Barrera CERRADA - Paso completado")
+
+@micropython.native
+def _dispatch(command):
+    """Traducir un comando (bytes) a su código CMD_*"""
+    if command == b"SUBIR":
+        return CMD_SUBIR
+    if command == b"BAJAR":
+        return CMD_BAJAR
+    if command == b"ABRIR_PASO":
+        return CMD_ABRIR_PASO
+    return CMD_DESCONOCIDO
+
+async def barrier_loop():
+    """Cerrar la barrera cuando vence el cierre pendiente (sin cierre pendiente no despierta)"""
+    while True:
+        if barrier_close_deadline is None:
+            await barrier_event.wait()
         else:
-            print("\nNo se pudo conectar a la red WiFi.")
-            return None
-def start_server():
-    ip = connect_wifi()
+            # El planificador queda en poll hasta el vencimiento o hasta un comando nuevo
+            espera_ms = max(0, time.ticks_diff(barrier_close_deadline, time.ticks_ms()))
+            try:
+                await asyncio.wait_for(barrier_event.wait(), espera_ms / 1000)
+            except asyncio.TimeoutError:
+                pass
+        barrier_event.clear()
+        check_barrier()
+
+async def handle(reader, writer):
+    """Atender los comandos de un cliente, uno por línea"""
+    global barrier_close_deadline
+    print("Cliente conectado desde:", writer.get_extra_info('peername'))
+    # indicaciones para raspberry sobre subir o bajar el servomotor y permitir la entrada del carro
+    try:
+        if hasattr(socket, "TCP_NODELAY"):
+            # Enviar cada respuesta de inmediato, sin esperar a juntar más datos (Nagle);
+            # en MicroPython el socket del stream está en writer.s
+            conn = getattr(writer, 's', None) or writer.get_extra_info('socket')
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        
+        while True:
+            # La GUI termina cada comando en \n; readline lee del stream del socket sin
+            # recv intermedios y un comando nunca queda partido entre dos lecturas
+            data = await reader.readline()
+            if not data:
+                break
+            command = data.strip()  # Se compara en bytes, sin decodificar
+            print("Comando recibido:", command)
+            codigo = _dispatch(command)
+            
+            if codigo == CMD_SUBIR:
+                servoprofe.duty_ns(DUTY_OPEN)  # Posición para subir (barrera abierta)
+                barrier_close_deadline = None  # Queda abierta hasta un BAJAR
+                barrier_event.set()
+                response = RESP_SUBIR
+                print("Barrera ABIERTA - Permitiendo paso del carro")
+                
+            elif codigo == CMD_BAJAR:
+                servoprofe.duty_ns(DUTY_CLOSED)  # Posición para bajar (barrera cerrada)
+                barrier_close_deadline = None
+                barrier_event.set()
+                response = RESP_BAJAR
+                print("Barrera CERRADA - Paso bloqueado")
+                
+            elif codigo == CMD_ABRIR_PASO:
+                # Comando especial: abrir y cerrar automáticamente tras DWELL_MS (tiempo
+                # para que pase el carro) mientras el servidor sigue atendiendo clientes
+                servoprofe.duty_ns(DUTY_OPEN)  # Abrir barrera
+                barrier_close_deadline = time.ticks_add(time.ticks_ms(), DWELL_MS)
+                barrier_event.set()
+                print("Barrera ABIERTA - Carro pasando...")
+                response = RESP_PASO
+                
+            else:
+                response = RESP_DESCONOCIDO
+            
+            # drain termina de enviar la respuesta completa aunque el socket acepte solo
+            # una parte (reintenta sobre un memoryview, sin copiar la respuesta)
+            writer.write(response)
+            await writer.drain()
+    except Exception as e:
+        print(f"Error en conexión: {e}")
+    finally:
+        writer.close()
+        await writer.wait_closed()
+        print("Cliente desconectado.")
+
+async def start_server():
+    ip = await connect_wifi()
     if not ip:
         return
-    s = socket.socket()
-    s.bind(('', 1718))
-    s.listen(1)
+    # start_server crea el socket AF_INET/SOCK_STREAM con SO_REUSEADDR, así el puerto
+    # se puede volver a abrir enseguida tras un reinicio
+    servidor = await asyncio.start_server(handle, '0.0.0.0', 1718)
     print(f"Servidor iniciado en {ip}:1718")
     print("Esperando cliente...")
-    # indicaciones para raspberry sobre subir o bajar el servomotor y permitir la entrada del carro
-
-    while True:
-            try:
-                conn, addr = s.accept()
-                print("Cliente conectado desde:", addr)
-                while True:
-                    data = conn.recv(1024)
-                    if not data:
-                        break
-                    command = data.decode('utf-8').strip()
-                    print("Comando recibido:", command)
-                    
-                    if command == "SUBIR":
-                        servoprofe.duty_ns(800000)  # Posición para subir (barrera abierta)
-                        response = "Barrera subiendo - Carro puede pasar."
-                        print("Barrera ABIERTA - Permitiendo paso del carro")
-                        
-                    elif command == "BAJAR":
-                        servoprofe.duty_ns(1700000)  # Posición para bajar (barrera cerrada)
-                        response = "Barrera bajando - Paso bloqueado."
-                        print("Barrera CERRADA - Paso bloqueado")
-                        
-                    elif command == "ABRIR_PASO":
-                        # Comando especial: abrir, esperar, y cerrar automáticamente
-                        servoprofe.duty_ns(800000)  # Abrir barrera
-                        print("Barrera ABIERTA - Carro pasando...")
-                        time.sleep(3)  # Esperar 3 segundos para que pase el carro
-                        servoprofe.duty_ns(1700000)  # Cerrar barrera
-                        print("Barrera CERRADA - Paso completado")
-                        response = "Secuencia de paso completada."
-                        
-                    else:
-                        response = "Comando no reconocido. Usar: SUBIR, BAJAR, o ABRIR_PASO"
-                    
-                    conn.send(response.encode('utf-8'))
-                conn.close()
-                print("Cliente desconectado.")
-            except Exception as e:
-                    print(f"Error en conexión: {e}")
-                    time.sleep(1)
+    asyncio.create_task(barrier_loop())
+    # Cada cliente se atiende en su propia tarea del mismo planificador
+    await servidor.wait_closed()
 
 try:
-    start_server()
+    asyncio.run(start_server())
 except KeyboardInterrupt:
     print("\nServidor detenido")
 except Exception as e:
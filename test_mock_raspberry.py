@@ -4,10 +4,23 @@ Script de prueba para verificar el sistema de parqueos dual
 Simula conexiones de Raspberry Pi para probar la funcionalidad del GUI
 """
 
+import asyncio
+import signal
 import socket
-import threading
-import time
 import sys
+from concurrent.futures import ThreadPoolExecutor
+try:
+    import uvloop  # Opcional (pip install uvloop): ciclo de eventos más rápido en Linux/macOS
+except ImportError:
+    uvloop = None
+
+COLA_CONEXIONES = 128  # Conexiones pendientes que acepta cada servidor (la GUI reconecta seguido)
+
+# Parqueos simulados: (parqueo_id, puerto), los mismos puertos que usan las Raspberry reales
+PARQUEOS = (
+    (1, 1718),
+    (2, 1719),
+)
 
 class MockRaspberryPi:
     """Servidor simulado de Raspberry Pi para pruebas"""
@@ -15,59 +28,97 @@ class MockRaspberryPi:
     def __init__(self, parqueo_id, puerto):
         self.parqueo_id = parqueo_id
         self.puerto = puerto
-        self.running = False
         self.servidor = None
         
-    def iniciar_servidor(self):
-        """Iniciar el servidor simulado"""
+        # Respuestas ya codificadas (terminadas en \n), armadas una sola vez por parqueo
+        # (comando en bytes, tal como llega -> respuesta)
+        self._respuestas = {b"ESTADO": f"ESTADO_OK_PARQUEO_{parqueo_id}\n".encode('utf-8')}
+        for comando in ("SUBIR", "BAJAR", "ABRIR_PASO"):
+            self._respuestas[comando.encode('utf-8')] = f"OK_{comando}_PARQUEO_{parqueo_id}\n".encode('utf-8')
+        
+    async def iniciar_servidor(self):
+        """Iniciar el servidor simulado y atender clientes hasta que se detenga"""
         try:
-            self.servidor = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            self.servidor.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-            self.servidor.bind(('localhost', self.puerto))
-            self.servidor.listen(1)
-            self.running = True
-            
+            # SO_REUSEPORT (Linux) permite correr varios simuladores en el mismo puerto
+            self.servidor = await asyncio.start_server(
+                self.atender_cliente, 'localhost', self.puerto,
+                backlog=COLA_CONEXIONES, reuse_address=True,
+                reuse_port=hasattr(socket, "SO_REUSEPORT"))
             print(f"Mock Parqueo {self.parqueo_id} iniciado en puerto {self.puerto}")
             
-            while self.running:
-                try:
-                    cliente, direccion = self.servidor.accept()
-                    print(f"Parqueo {self.parqueo_id}: Conexión desde {direccion}")
-                    
-                    # Leer comando
-                    data = cliente.recv(1024).decode('utf-8').strip()
-                    print(f"Parqueo {self.parqueo_id}: Comando recibido: {data}")
-                    
-                    # Responder según el comando
-                    if data == "ESTADO":
-                        respuesta = f"ESTADO_OK_PARQUEO_{self.parqueo_id}"
-                    elif data in ["SUBIR", "BAJAR", "ABRIR_PASO"]:
-                        respuesta = f"OK_{data}_PARQUEO_{self.parqueo_id}"
-                    else:
-                        respuesta = f"ERROR_COMANDO_DESCONOCIDO_{data}"
-                    
-                    cliente.send(respuesta.encode('utf-8'))
-                    print(f"Parqueo {self.parqueo_id}: Respuesta enviada: {respuesta}")
-                    cliente.close()
-                    
-                except socket.error as e:
-                    if self.running:
-                        print(f"Error en Parqueo {self.parqueo_id}: {e}")
-                    break
-                    
-        except Exception as e:
+            async with self.servidor:
+                await self.servidor.serve_forever()
+                
+        except OSError as e:
             print(f"Error iniciando Mock Parqueo {self.parqueo_id}: {e}")
+            raise  # Sin este parqueo no tiene sentido seguir simulando
+    
+    async def atender_cliente(self, reader, writer):
+        """Responder los comandos de un cliente, uno por línea, hasta que cierre la conexión"""
+        direccion = writer.get_extra_info('peername')
+        print(f"Parqueo {self.parqueo_id}: Conexión desde {direccion}")
+        
+        try:
+            # La conexión se mantiene abierta entre comandos, igual que en la Raspberry real
+            while True:
+                # Leer comando
+                linea = await reader.readline()
+                if not linea:
+                    break
+                data = linea.strip()  # Se compara en bytes, sin decodificar
+                print(f"Parqueo {self.parqueo_id}: Comando recibido: {data}")
+                
+                # Responder según el comando
+                respuesta = self._respuestas.get(data)
+                if respuesta is None:
+                    respuesta = b"ERROR_COMANDO_DESCONOCIDO_" + data + b"\n"
+                
+                writer.write(respuesta)  # Cada respuesta termina en \n
+                await writer.drain()
+                print(f"Parqueo {self.parqueo_id}: Respuesta enviada: {respuesta}")
+            
+        except ConnectionError as e:
+            print(f"Error en Parqueo {self.parqueo_id}: {e}")
+        except asyncio.CancelledError:
+            pass  # El simulador se está deteniendo con la conexión aún abierta
         finally:
-            if self.servidor:
-                self.servidor.close()
+            writer.close()
+            print(f"Parqueo {self.parqueo_id}: Cliente {direccion} desconectado")
     
     def detener_servidor(self):
         """Detener el servidor simulado"""
-        self.running = False
         if self.servidor:
             self.servidor.close()
         print(f"Mock Parqueo {self.parqueo_id} detenido")
 
+async def ejecutar_simuladores(parqueos):
+    """Correr todos los servidores simulados en un mismo ciclo de eventos hasta Ctrl+C"""
+    loop = asyncio.get_running_loop()
+    # start_server resuelve 'localhost' en el executor por defecto; dos hilos bastan
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=2))
+    
+    # Ctrl+C (o SIGTERM) solo marca el evento; en Windows no hay manejadores de señales
+    # en el ciclo de eventos y Ctrl+C llega como KeyboardInterrupt
+    detener = asyncio.Event()
+    for senal in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(senal, detener.set)
+        except NotImplementedError:
+            pass
+    
+    servidores = asyncio.gather(*(parqueo.iniciar_servidor() for parqueo in parqueos))
+    espera = asyncio.ensure_future(detener.wait())
+    
+    # Mientras tanto el proceso queda bloqueado en el selector, sin despertares periódicos.
+    # Se sale al pedir la detención o si un servidor falla (p. ej. puerto ocupado)
+    await asyncio.wait((servidores, espera), return_when=asyncio.FIRST_COMPLETED)
+    espera.cancel()
+    servidores.cancel()
+    try:
+        await servidores  # Propaga el error del servidor que falló, si lo hubo
+    except asyncio.CancelledError:
+        pass
+
 def main():
     """Función principal del simulador"""
     print("SIMULADOR DE RASPBERRY PI PARA PARQUEOS")
@@ -77,37 +128,32 @@ def main():
     print("=" * 50)
     
     # Crear servidores simulados
-    parqueo1 = MockRaspberryPi(1, 1718)
-    parqueo2 = MockRaspberryPi(2, 1719)
+    parqueos = [MockRaspberryPi(parqueo_id, puerto) for parqueo_id, puerto in PARQUEOS]
+    
+    # Todos los servidores corren en un solo hilo, cada cliente es una corrutina
+    if uvloop is not None:
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
     
-    # Iniciar servidores en hilos separados
     try:
-        hilo1 = threading.Thread(target=parqueo1.iniciar_servidor, daemon=True)
-        hilo2 = threading.Thread(target=parqueo2.iniciar_servidor, daemon=True)
-        
-        hilo1.start()
-        time.sleep(0.5)  # Pequeña pausa entre inicios
-        hilo2.start()
-        
-        print(f"\nAmbos servidores simulados iniciados")
-        print(f"Parqueo 1: localhost:1718")
-        print(f"Parqueo 2: localhost:1719")
+        print(f"\nIniciando ambos servidores simulados")
+        for parqueo in parqueos:
+            print(f"Parqueo {parqueo.parqueo_id}: localhost:{parqueo.puerto}")
         print(f"\nAhora puedes ejecutar GUI.py y usar localhost como IP para ambos parqueos")
         print(f"Esperando conexiones... (Ctrl+C para salir)\n")
         
-        # Mantener el programa corriendo
-        while True:
-            time.sleep(1)
+        asyncio.run(ejecutar_simuladores(parqueos))
             
     except KeyboardInterrupt:
-        print(f"\nDeteniendo simuladores...")
-        parqueo1.detener_servidor()
-        parqueo2.detener_servidor()
-        print(f"Simuladores detenidos correctamente")
-        sys.exit(0)
+        pass
     except Exception as e:
         print(f"Error crítico: {e}")
         sys.exit(1)
+    
+    print(f"\nDeteniendo simuladores...")
+    for parqueo in parqueos:
+        parqueo.detener_servidor()
+    print(f"Simuladores detenidos correctamente")
+    sys.exit(0)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()